@@ -4,15 +4,29 @@ Also contains shared tool handling logic.
 """
 
 import asyncio
-import json
 import logging
 from typing import Dict, Any
 
+import orjson
+
 from openai_manager import OpenAIRealtimeManager
 from gemini_manager import GeminiLiveManager
 
 logger = logging.getLogger(__name__)
 
+_TOOL_SEP = "=" * 60
+
+# Upper bound on how long Disconnect_Socket waits for the API's final turn
+DISCONNECT_CONFIRMATION_TIMEOUT = 10.0
+
+# Shared result for Disconnect_Socket responses; treated as read-only downstream
+_DISCONNECT_OK = {"status": "success", "message": "Socket will be disconnected"}
+
+
+def _fmt(obj) -> str:
+    """Pretty-print a tool payload for logging."""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2, default=str).decode()
+
 
 def get_api_manager(api_provider: str, api_key: str):
     """Factory function to get the appropriate API manager.
@@ -36,71 +50,94 @@ class ToolHandler:
     """Handles function/tool calls from the AI models."""
 
     def __init__(self):
-        pass
+        # Tool name -> (handler, terminates). Terminating handlers end the
+        # session, so they run after every other call has been answered.
+        self._HANDLERS = {
+            'Disconnect_Socket': (self._handle_disconnect_tool, True),
+            'Sound_Alarm': (self._handle_alarm_tool, False),
+        }
+
+    def _terminates(self, function_name: str) -> bool:
+        """Return True if the named tool ends the session."""
+        entry = self._HANDLERS.get(function_name)
+        return entry is not None and entry[1]
 
     async def handle_function_call(self, tool_calls: list, voice_agent):
         """Handle function calls from the assistant.
         
+        Independent tool calls run concurrently and their results are sent back
+        in a single response. Disconnect calls run last, one at a time.
+        
         Args:
             tool_calls: List of tool call dictionaries with 'name', 'arguments', and 'call_id'
             voice_agent: The VoiceCheckAgent instance
         """
-        results = []
-        
-        for tool_call in tool_calls:
+        disconnect_calls = [tc for tc in tool_calls if self._terminates(tc['name'])]
+        parallel_calls = [tc for tc in tool_calls if not self._terminates(tc['name'])]
+
+        results = await asyncio.gather(*(self._dispatch(tc, voice_agent) for tc in parallel_calls))
+
+        # Send all results back to the API
+        if results:
+            await voice_agent.api_manager.send_tool_response(list(results))
+
+        for tool_call in disconnect_calls:
             function_name = tool_call['name']
             arguments = tool_call['arguments']
             call_id = tool_call.get('call_id', function_name)
-            
-            print(f"\n{'='*60}")
-            print(f"🔧 TOOL CALL DETECTED")
-            print(f"Function: {function_name}")
-            print(f"Call ID: {call_id}")
-            print(f"Arguments: {arguments}")
-            print(f"{'='*60}")
 
-            try:
-                logger.info(f"🔧 Executing tool: {function_name} with args: {arguments}")
-
-                if function_name == 'Disconnect_Socket':
-                    await self._handle_disconnect_tool(arguments, call_id, voice_agent)
-                    # For disconnect, we don't add to results since we're disconnecting
-                    return  
-
-                elif function_name == 'Sound_Alarm':
-                    result = await self._handle_alarm_tool(arguments, call_id, voice_agent)
-                    results.append({
-                        'name': function_name,
-                        'call_id': call_id,
-                        'result': result
-                    })
+            self._log_tool_call(function_name, call_id, arguments)
 
-                else:
-                    print(f"❌ UNKNOWN TOOL CALLED: {function_name}")
-                    logger.warning(f"❌ Unknown tool called: {function_name}")
-                    results.append({
+            handler, _ = self._HANDLERS[function_name]
+            try:
+                await handler(arguments, call_id, voice_agent)
+                # For disconnect, we don't send further results since we're disconnecting
+                return
+            except Exception as e:
+                logger.error("❌ Error handling function call %s: %s", function_name, e)
+                # Answer the call so the model isn't left waiting on it
+                try:
+                    await voice_agent.api_manager.send_tool_response([{
                         'name': function_name,
                         'call_id': call_id,
-                        'result': {"error": f"Unknown function: {function_name}"}
-                    })
+                        'result': {"error": str(e)}
+                    }])
+                except Exception as send_err:
+                    logger.error("❌ Failed to send error response for %s: %s", function_name, send_err)
+
+    def _log_tool_call(self, function_name: str, call_id: str, arguments):
+        """Log a banner for an incoming tool call."""
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        logger.info("\n%s\n🔧 TOOL CALL\nFunction: %s\nCall ID: %s\nArguments: %s\n%s",
+                    _TOOL_SEP, function_name, call_id, _fmt(arguments), _TOOL_SEP)
+
+    async def _dispatch(self, tool_call: dict, voice_agent) -> dict:
+        """Run a single non-terminating tool call and return its result entry."""
+        function_name = tool_call['name']
+        arguments = tool_call['arguments']
+        call_id = tool_call.get('call_id', function_name)
+
+        self._log_tool_call(function_name, call_id, arguments)
+
+        entry = self._HANDLERS.get(function_name)
+        try:
+            if entry is None:
+                logger.warning("❌ Unknown tool called: %s", function_name)
+                result = {"error": f"Unknown function: {function_name}"}
+            else:
+                handler, _ = entry
+                result = await handler(arguments, call_id, voice_agent)
+
+        except Exception as e:
+            logger.error("❌ Error handling function call %s: %s", function_name, e)
+            result = {"error": str(e)}
 
-            except Exception as e:
-                print(f"❌ ERROR IN TOOL EXECUTION")
-                print(f"Function: {function_name}")
-                print(f"Error: {str(e)}")
-                logger.error(f"❌ Error handling function call {function_name}: {e}")
-                
-                results.append({
-                    'name': function_name,
-                    'call_id': call_id,
-                    'result': {"error": str(e)}
-                })
-
-            print(f"{'='*60}\n")
-        
-        # Send all results back to the API
-        if results:
-            await voice_agent.api_manager.send_tool_response(results)
+        return {
+            'name': function_name,
+            'call_id': call_id,
+            'result': result
+        }
 
     async def _handle_disconnect_tool(self, args: dict, call_id: str, voice_agent):
         """Handle disconnect socket tool call."""
@@ -117,20 +154,25 @@ class ToolHandler:
         await voice_agent.api_manager.send_tool_response([{
             'name': 'Disconnect_Socket',
             'call_id': call_id,
-            'result': {
-                "status": "success",
-                "message": "Socket will be disconnected"
-            }
+            'result': _DISCONNECT_OK
         }])
         logger.info(f"🔌 DISCONNECT TOOL RESPONSE SENT TO API")
 
-        # Wait for confirmation before disconnecting
-        print(f"🔌 WAITING 2 SECONDS FOR FINAL MESSAGE BEFORE DISCONNECTING")
-        logger.info(f"🔌 Waiting 2 seconds for final message before disconnect")
-        await asyncio.sleep(2)
-        
-        logger.info(f"🔌 INITIATING DISCONNECT FROM TOOL HANDLER")
-        await voice_agent.disconnect()
+        # Wait for the API to finish its final turn and for the farewell audio to play,
+        # but never longer than the timeout in total
+        logger.info("🔌 Waiting up to %.0f seconds for final message before disconnect", DISCONNECT_CONFIRMATION_TIMEOUT)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + DISCONNECT_CONFIRMATION_TIMEOUT
+        try:
+            await asyncio.wait_for(voice_agent.confirmation_event.wait(), DISCONNECT_CONFIRMATION_TIMEOUT)
+            # The turn-complete event arrives as soon as the audio is received, not played;
+            # closing the streams now would drop whatever is still queued for the speakers
+            await voice_agent.audio_manager.wait_for_playback(deadline - loop.time())
+        except asyncio.TimeoutError:
+            logger.info("🔌 No turn completion received before timeout")
+        finally:
+            logger.info(f"🔌 INITIATING DISCONNECT FROM TOOL HANDLER")
+            await voice_agent.disconnect()
 
     async def _handle_alarm_tool(self, args: dict, call_id: str, voice_agent):
         """Handle sound alarm tool call."""
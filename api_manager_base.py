@@ -8,15 +8,32 @@ from typing import Dict, Any, Optional, AsyncIterator, List
 import asyncio
 import logging
 
+try:
+    import pybase64 as _base64
+except ImportError:
+    import base64 as _base64
+
 logger = logging.getLogger(__name__)
 
 
 class RealtimeAPIManager(ABC):
     """Abstract base class for real-time API managers."""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_wait_ms: float = 60):
+        """
+        Args:
+            api_key: The API key for the provider
+            max_wait_ms: Longest time microphone audio is held back so that consecutive
+                chunks can be sent as one message; 0 sends every chunk immediately
+        """
         self.api_key = api_key
         self.is_connected = False
+        self.max_wait_ms = max_wait_ms
+        
+        # Audio waiting to be sent as one batch
+        self._audio_accum = bytearray()
+        self._audio_accum_rate = None
+        self._audio_flush_task = None
         
     @abstractmethod
     async def create_session(self) -> str:
@@ -38,9 +55,51 @@ class RealtimeAPIManager(ABC):
         """Configure the session with system prompt and tools."""
         pass
     
-    @abstractmethod
     async def send_audio(self, audio_data: bytes, source_sample_rate: int = 24000):
-        """Send audio data to the API."""
+        """Send audio data to the API, batching chunks that arrive within max_wait_ms."""
+        if self.max_wait_ms <= 0:
+            await self._send_audio_chunk(audio_data, source_sample_rate)
+            return
+        
+        if self._audio_accum and source_sample_rate != self._audio_accum_rate:
+            await self._flush_audio()
+        self._audio_accum += audio_data
+        self._audio_accum_rate = source_sample_rate
+        
+        # Flush once max_wait_ms worth of 16-bit mono audio is buffered...
+        if len(self._audio_accum) >= source_sample_rate * self.max_wait_ms // 500:
+            await self._flush_audio()
+        # ...or when max_wait_ms has passed since the batch started
+        elif self._audio_flush_task is None:
+            self._audio_flush_task = asyncio.create_task(self._flush_audio_later())
+    
+    async def _flush_audio_later(self):
+        """Flush the pending batch after max_wait_ms."""
+        await asyncio.sleep(self.max_wait_ms / 1000)
+        self._audio_flush_task = None
+        await self._flush_audio()
+    
+    async def _flush_audio(self):
+        """Send any buffered audio as a single chunk."""
+        if self._audio_flush_task is not None:
+            self._audio_flush_task.cancel()
+            self._audio_flush_task = None
+        if not self._audio_accum:
+            return
+        audio_data = bytes(self._audio_accum)
+        self._audio_accum.clear()
+        await self._send_audio_chunk(audio_data, self._audio_accum_rate)
+    
+    def _reset_audio_batch(self):
+        """Drop buffered audio and its pending flush, e.g. on disconnect."""
+        if self._audio_flush_task is not None:
+            self._audio_flush_task.cancel()
+            self._audio_flush_task = None
+        self._audio_accum.clear()
+    
+    @abstractmethod
+    async def _send_audio_chunk(self, audio_data: bytes, source_sample_rate: int):
+        """Send one (possibly batched) chunk of audio data to the API."""
         pass
     
     @abstractmethod
@@ -67,9 +126,24 @@ class APIMessage:
                  content: Optional[str] = None,
                  audio_data: Optional[bytes] = None,
                  tool_calls: Optional[List[Dict[str, Any]]] = None,
-                 metadata: Optional[Dict[str, Any]] = None):
-        self.message_type = message_type  # 'text', 'audio', 'tool_call', 'error', 'session_update'
+                 metadata: Optional[Dict[str, Any]] = None,
+                 audio_b64: Optional[str] = None):
+        self.message_type = message_type  # 'text', 'audio', 'tool_call', 'turn_complete', 'error', 'session_update'
         self.content = content
-        self.audio_data = audio_data
+        self._audio_data = audio_data
+        self._audio_b64 = audio_b64  # Base64 audio, decoded on first access to audio_data
         self.tool_calls = tool_calls
-        self.metadata = metadata or {} 
\ No newline at end of file
+        self.metadata = metadata or {}
+    
+    @property
+    def audio_data(self) -> Optional[bytes]:
+        """Raw audio bytes; base64 audio passed as audio_b64 is decoded on first access."""
+        if self._audio_b64 is not None:
+            self._audio_data = _base64.b64decode(self._audio_b64)
+            self._audio_b64 = None
+        return self._audio_data
+    
+    @audio_data.setter
+    def audio_data(self, value: Optional[bytes]):
+        self._audio_data = value
+        self._audio_b64 = None
@@ -0,0 +1,196 @@
+"""
+Audio DSP kernels - compiled with Numba when available, plain Python/NumPy otherwise.
+
+Kernels compile on first call rather than at import, so importing this module stays
+cheap for code paths that never use them; cache=True keeps later runs to a disk load.
+"""
+
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Fallback decorator that leaves the function uncompiled."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True, fastmath=True)
+def nlms_step(mic, ref, w, mu):
+    """
+    Run a normalized LMS adaptive filter over one chunk of microphone audio.
+
+    Args:
+        mic: int16 microphone samples (desired signal d[n])
+        ref: int16 reference (speaker) samples; must hold len(mic) + len(w) - 1 samples,
+             the last len(w) - 1 of which precede the chunk
+        w: float32 filter weights, updated in place
+        mu: adaptation step size
+
+    Returns:
+        int16 error signal e[n] = d[n] - w^T x[n], i.e. the echo-cancelled audio
+    """
+    taps = w.shape[0]
+    out = np.empty(mic.shape[0], np.int16)
+    for n in range(mic.shape[0]):
+        y = np.float32(0.0)
+        energy = np.float32(1.0)
+        for k in range(taps):
+            x = np.float32(ref[n + taps - 1 - k])
+            y += w[k] * x
+            energy += x * x
+        e = np.float32(mic[n]) - y
+        g = mu * e / energy
+        for k in range(taps):
+            w[k] += g * np.float32(ref[n + taps - 1 - k])
+        if e > 32767.0:
+            e = np.float32(32767.0)
+        elif e < -32768.0:
+            e = np.float32(-32768.0)
+        out[n] = np.int16(e)
+    return out
+
+
+@njit(cache=True, fastmath=True, boundscheck=False)
+def _rms_i16_kernel(x):
+    s = np.int64(0)
+    for i in range(x.shape[0]):
+        v = np.int64(x[i])
+        s += v * v
+    return (s / max(x.shape[0], 1)) ** 0.5 / 32768.0
+
+
+def _rms_i16_numpy(x):
+    # Exact int64 sum of squares straight on the int16 samples - no float copy
+    s = int(np.einsum('i,i->', x, x, dtype=np.int64))
+    return (s / max(x.size, 1)) ** 0.5 / 32768.0
+
+
+# RMS of int16 samples relative to full scale, in a single pass
+rms_i16 = _rms_i16_kernel if NUMBA_AVAILABLE else _rms_i16_numpy
+
+
+@njit(cache=True, fastmath=True, boundscheck=False)
+def _rms_exceeds_kernel(x, threshold, block=256):
+    n = x.shape[0]
+    # Compare sums of squares instead of taking a root; the total only grows,
+    # so the scan can stop at the first block that pushes it over the limit
+    limit = (threshold * 32768.0) ** 2 * n
+    s = np.int64(0)
+    for start in range(0, n, block):
+        for i in range(start, min(start + block, n)):
+            v = np.int64(x[i])
+            s += v * v
+        if s >= limit:
+            return True
+    return False
+
+
+def _rms_exceeds_numpy(x, threshold, block=256):
+    return _rms_i16_numpy(x) >= threshold
+
+
+# Whether the RMS of int16 samples reaches threshold (relative to full scale) - exact,
+# but the compiled scan stops at the first block that proves the chunk isn't silent
+rms_exceeds = _rms_exceeds_kernel if NUMBA_AVAILABLE else _rms_exceeds_numpy
+
+
+def lowpass_taps(factor: int, num_taps: int = 48) -> np.ndarray:
+    """Design windowed-sinc low-pass FIR taps for decimating by an integer factor."""
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = np.sinc(n / factor) * np.hamming(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+@njit(cache=True, fastmath=True)
+def _fir_decimate_kernel(x, taps, history, phase, factor):
+    hist = history.shape[0]
+    total = hist + x.shape[0]
+    buf = np.empty(total, np.float32)
+    buf[:hist] = history
+    for i in range(x.shape[0]):
+        buf[hist + i] = x[i]
+
+    start = hist + phase
+    count = 0
+    if start < total:
+        count = (total - 1 - start) // factor + 1
+    out = np.empty(count, np.int16)
+    for k in range(count):
+        idx = start + k * factor
+        acc = np.float32(0.0)
+        for j in range(taps.shape[0]):
+            acc += taps[j] * buf[idx - j]
+        acc = np.rint(acc)
+        if acc > 32767.0:
+            acc = 32767.0
+        elif acc < -32768.0:
+            acc = -32768.0
+        out[k] = np.int16(acc)
+
+    history[:] = buf[total - hist:]
+    return out, start + count * factor - total
+
+
+def _fir_decimate_numpy(x, taps, history, phase, factor):
+    hist = history.shape[0]
+    buf = np.concatenate((history, x.astype(np.float32)))
+    filtered = np.convolve(buf, taps, mode='valid')[phase::factor]
+    history[:] = buf[buf.size - hist:]
+    out = np.clip(np.rint(filtered), -32768, 32767).astype(np.int16)
+    return out, phase + out.size * factor - x.size
+
+
+# The NumPy version is far faster than an uncompiled per-sample loop
+fir_decimate = _fir_decimate_kernel if NUMBA_AVAILABLE else _fir_decimate_numpy
+
+
+class Decimator:
+    """Streaming int16 decimator (e.g. 48 kHz -> 16 kHz) that keeps filter state across chunks."""
+
+    def __init__(self, factor: int, num_taps: int = 48):
+        self.factor = factor
+        self.taps = lowpass_taps(factor, num_taps)
+        self._history = np.zeros(num_taps - 1, np.float32)
+        self._phase = 0
+
+    def process(self, audio_data: bytes) -> bytes:
+        """Low-pass filter and downsample one chunk of int16 PCM."""
+        x = np.frombuffer(audio_data, dtype=np.int16)
+        out, self._phase = fir_decimate(x, self.taps, self._history, self._phase, self.factor)
+        return out.tobytes()
+
+
+class Resampler:
+    """Streaming int16 rational resampler (e.g. 24 kHz -> 16 kHz) that keeps filter state across chunks."""
+
+    def __init__(self, from_rate: int, to_rate: int, num_taps: int = 48):
+        g = math.gcd(from_rate, to_rate)
+        self.up = to_rate // g
+        self.down = from_rate // g
+        # Zero-stuffing by `up` divides the signal's gain by `up`; the taps restore it
+        self.taps = lowpass_taps(max(self.up, self.down), num_taps * self.up) * np.float32(self.up)
+        self._history = np.zeros(self.taps.size - 1, np.float32)
+        self._phase = 0
+
+    def process_array(self, x: np.ndarray) -> np.ndarray:
+        """Resample one chunk of int16 samples."""
+        if self.up == self.down:
+            return x
+        if self.up > 1:
+            stuffed = np.zeros(x.size * self.up, np.int16)
+            stuffed[::self.up] = x
+            x = stuffed
+        out, self._phase = fir_decimate(x, self.taps, self._history, self._phase, self.down)
+        return out
+
@@ -5,17 +5,55 @@ Audio Feedback Manager - Provides various strategies to prevent microphone from
 
 import time
 import logging
-import threading
-from typing import Optional, Callable
-import numpy as np
-import pyaudio
-import collections
+from functools import lru_cache
+from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=None)
+def get_pyaudio():
+    """Return the process-wide PyAudio instance, initializing PortAudio on first use."""
+    import pyaudio
+    return pyaudio.PyAudio()
+
+
+@lru_cache(maxsize=None)
+def get_default_input_device_info() -> dict:
+    """Return (and cache) the default input device info from the shared PyAudio instance."""
+    return get_pyaudio().get_default_input_device_info()
+
+
+@lru_cache(maxsize=None)
+def get_default_device_indices() -> Tuple[int, int]:
+    """Return (and cache) the default (input, output) device indices; -1 means no device."""
+    host_api = get_pyaudio().get_default_host_api_info()
+    return host_api['defaultInputDevice'], host_api['defaultOutputDevice']
+
+
+def release_pyaudio():
+    """Terminate the shared PyAudio instance and forget cached device info."""
+    if get_pyaudio.cache_info().currsize:
+        get_pyaudio().terminate()
+    get_pyaudio.cache_clear()
+    get_default_input_device_info.cache_clear()
+    get_default_device_indices.cache_clear()
+
 class AudioFeedbackManager:
-    """Manages audio feedback prevention using various strategies."""
-    
+    """Manages audio feedback prevention using various strategies.
+
+    Constructing an AudioFeedbackManager returns the subclass for the chosen
+    strategy, so the per-chunk methods carry no strategy checks.
+    """
+
+    _description = None
+    echo_cancellation_enabled = False
+
+    def __new__(cls, strategy: str = "smart_muting", *args, **kwargs):
+        if cls is AudioFeedbackManager:
+            cls = _STRATEGY_MAP.get(strategy, AudioFeedbackManager)
+        return super().__new__(cls)
+
     def __init__(self, 
                  strategy: str = "smart_muting",
                  ai_speech_delay: float = 0.5,
@@ -30,36 +68,129 @@ class AudioFeedbackManager:
         """
         self.strategy = strategy
         self.ai_speech_delay = ai_speech_delay
+        self._ai_speech_delay_ns = int(ai_speech_delay * 1e9)
         self.push_to_talk_key = push_to_talk_key
         
-        # State tracking
-        self.ai_is_speaking = False
+        # State tracking - AI speech is tracked as monotonic_ns deadlines that
+        # incoming AI audio extends and that simply expire when it stops
+        self._ai_playback_end_ns = 0  # When the queued AI audio finishes playing
+        self._ai_speaking_until_ns = 0  # Playback end plus ai_speech_delay
         self.microphone_muted = False
-        self.last_ai_audio_time = 0
         self.push_to_talk_pressed = False
         self.manual_mute = False
+        self._status = dict.fromkeys((
+            "strategy", "ai_is_speaking", "microphone_muted",
+            "manual_mute", "push_to_talk_pressed", "time_since_ai_stopped",
+        ))
         
-        # Echo cancellation
-        self.reference_audio_buffer = []
-        self.max_buffer_size = 1000  # Keep last 1000 audio chunks for reference
-        # Placeholder: minimal attributes kept for compatibility
-        self.echo_cancellation_enabled = False  # Real algorithm removed
-        
-        # Setup keyboard listener for push-to-talk
-        if strategy == "push_to_talk":
-            self._setup_keyboard_listener()
+        self._setup()
         
         # Log strategy info
-        if strategy == "api_handled":
-            logger.info("Using API-handled noise cancellation - no client-side audio processing")
-        elif strategy == "smart_muting":
-            logger.info("Using smart muting - microphone muted while AI speaks")
-        elif strategy == "echo_cancellation":
-            logger.info("Using echo cancellation - client-side processing")
-        elif strategy == "push_to_talk":
-            logger.info("Using push-to-talk - manual control required")
+        if self._description:
+            logger.info(self._description)
+    
+    def _setup(self):
+        """Strategy-specific initialization."""
+    
+    @property
+    def ai_is_speaking(self) -> bool:
+        """Whether queued AI audio is still playing."""
+        return time.monotonic_ns() < self._ai_playback_end_ns
+    
+    def mark_ai_speaking_start(self, duration_ns: int = 0):
+        """Mark that AI is speaking, extending the deadline by duration_ns of queued audio."""
+        end = max(self._ai_playback_end_ns, time.monotonic_ns()) + duration_ns
+        self._ai_playback_end_ns = end
+        self._ai_speaking_until_ns = end + self._ai_speech_delay_ns
+    
+    def mark_ai_speaking_end(self):
+        """Mark that AI has finished speaking.
+
+        Nothing to do - the deadline set by mark_ai_speaking_start expires by itself.
+        """
+    
+    def set_sample_rates(self, output_rate: int, mic_rate: int):
+        """Tell the strategy the playback rate and the rate of the mic audio it will process."""
+
+    def add_reference_audio(self, audio_data: bytes):
+        """Add AI's audio output, as it is played, as reference for echo cancellation."""
+    
+    def should_process_microphone_input(self) -> bool:
+        """Determine if microphone input should be processed based on current strategy."""
+        return not self.manual_mute
+    
+    def process_microphone_audio(self, audio_data: bytes) -> Optional[bytes]:
+        """
+        Process microphone audio data based on current strategy.
+        Returns None if audio should be suppressed, otherwise returns processed audio.
+        """
+        if not self.should_process_microphone_input():
+            return None
+        return audio_data
+    
+    def set_manual_mute(self, muted: bool):
+        """Manually mute/unmute the microphone."""
+        self.manual_mute = muted
+        logger.info(f"🎙️ Microphone {'muted' if muted else 'unmuted'} manually")
+    
+    def get_status(self) -> dict:
+        """Get current status of the feedback manager.
+
+        The same dict is updated in place and returned on every call; callers
+        that need a snapshot (or want to modify it) should copy it with dict().
+        """
+        status = self._status
+        now = time.monotonic_ns()
+        end = self._ai_playback_end_ns
+        status["strategy"] = self.strategy
+        status["ai_is_speaking"] = now < end
+        status["microphone_muted"] = self.microphone_muted
+        status["manual_mute"] = self.manual_mute
+        status["push_to_talk_pressed"] = self.push_to_talk_pressed if self.strategy == "push_to_talk" else None
+        status["time_since_ai_stopped"] = max(now - end, 0) / 1e9 if end > 0 else 0
+        return status
+
+
+class _ApiHandledFeedback(AudioFeedbackManager):
+    """No client-side processing - the API handles noise reduction and turn detection."""
+
+    _description = "Using API-handled noise cancellation - no client-side audio processing"
+
+    def process_microphone_audio(self, audio_data: bytes) -> Optional[bytes]:
+        return None if self.manual_mute else audio_data
+
+
+class _SmartMutingFeedback(AudioFeedbackManager):
+    """Mutes the microphone while the AI speaks and for a short delay afterwards."""
+
+    _description = "Using smart muting - microphone muted while AI speaks"
+
+    def mark_ai_speaking_start(self, duration_ns: int = 0):
+        super().mark_ai_speaking_start(duration_ns)
+        # Only log on the transition, not for every chunk of a response
+        if not self.microphone_muted:
+            self.microphone_muted = True
+            logger.info("🔇 AI speaking - microphone muted")
+    
+    def should_process_microphone_input(self) -> bool:
+        # Don't process if muted manually, or while AI audio plays plus the unmute delay
+        if self.manual_mute or time.monotonic_ns() < self._ai_speaking_until_ns:
+            return False
         
-    def _setup_keyboard_listener(self):
+        # Unmute microphone now that enough time has passed
+        if self.microphone_muted:
+            self.microphone_muted = False
+            logger.info("🎙️ Microphone unmuted")
+        
+        return True
+
+
+class _PushToTalkFeedback(AudioFeedbackManager):
+    """Only passes microphone audio while the push-to-talk key is held."""
+
+    _description = "Using push-to-talk - manual control required"
+
+    def _setup(self):
         """Setup keyboard listener for push-to-talk."""
         try:
             import keyboard
@@ -80,137 +211,132 @@ class AudioFeedbackManager:
             logger.warning("keyboard library not installed. Install with: pip install keyboard")
             logger.warning("Falling back to smart_muting strategy")
             self.strategy = "smart_muting"
+            self.__class__ = _SmartMutingFeedback
     
-    def mark_ai_speaking_start(self):
-        """Mark that AI has started speaking."""
-        self.ai_is_speaking = True
-        self.microphone_muted = True
-        self.last_ai_audio_time = time.time()
-        
-        if self.strategy == "smart_muting":
-            logger.info("🔇 AI speaking - microphone muted")
-    
-    def mark_ai_speaking_end(self):
-        """Mark that AI has finished speaking."""
-        if self.ai_is_speaking:
-            self.ai_is_speaking = False
-            self.last_ai_audio_time = time.time()
-            
-            if self.strategy == "smart_muting":
-                logger.info("🎙️ AI finished speaking - microphone will unmute shortly")
+    def should_process_microphone_input(self) -> bool:
+        return self.push_to_talk_pressed and not self.manual_mute
+
+
+class _EchoCancelFeedback(AudioFeedbackManager):
+    """Always processes microphone audio, removing speaker echo with an adaptive filter."""
+
+    _description = "Using echo cancellation - client-side processing"
+
+    echo_cancellation_enabled = True
+
+    def _setup(self):
+        # numpy and the DSP kernels are only needed by this strategy
+        import numpy as np
+        from audio_dsp import NUMBA_AVAILABLE, Resampler, nlms_step
+        if not NUMBA_AVAILABLE:
+            # The NLMS filter is a per-sample loop; uncompiled it can't keep up with the mic
+            logger.warning("numba not installed - echo cancellation needs it. Install with: pip install numba")
+            logger.warning("Falling back to smart_muting strategy")
+            self.strategy = "smart_muting"
+            self.__class__ = _SmartMutingFeedback
+            return
+        self._np = np
+        self._nlms_step = nlms_step
+        self._resampler_cls = Resampler
+
+        self.max_buffer_size = 1000  # Keep last 1000 audio chunks for reference
+        self.echo_filter_taps = 128
+        self.echo_step_size = np.float32(0.1)
+        # Reference audio ring buffer (int16 samples) and adaptive filter weights
+        self._ref_buf = np.zeros(self.max_buffer_size * 1024, np.int16)
+        self._ref_idx = 0
+        self._echo_weights = np.zeros(self.echo_filter_taps, np.float32)
+        self._ref_resampler = None  # Playback rate -> mic rate; set by set_sample_rates
+
+    def set_sample_rates(self, output_rate: int, mic_rate: int):
+        # The filter lines reference and mic up sample-for-sample, so both must share a rate
+        self._ref_resampler = self._resampler_cls(output_rate, mic_rate) if output_rate != mic_rate else None
+        self._ref_buf[:] = 0
+        self._ref_idx = 0
+        self._echo_weights[:] = 0
     
     def add_reference_audio(self, audio_data: bytes):
-        """Add AI's audio output as reference for echo cancellation."""
-        # Placeholder keeps method for interface but does nothing substantial
-        if self.strategy == "echo_cancellation":
-            pass  # No-op since algorithm is removed
-    
-    def should_process_microphone_input(self) -> bool:
-        """Determine if microphone input should be processed based on current strategy."""
-        current_time = time.time()
-        
-        if self.manual_mute:
-            return False
-        
-        if self.strategy == "api_handled":
-            # Always process - let the OpenAI API handle noise reduction and turn detection
-            return True
-        
-        elif self.strategy == "push_to_talk":
-            return self.push_to_talk_pressed
-        
-        elif self.strategy == "smart_muting":
-            # Don't process if AI is currently speaking
-            if self.ai_is_speaking:
-                return False
-            
-            # Don't process if not enough time has passed since AI stopped
-            if current_time - self.last_ai_audio_time < self.ai_speech_delay:
-                return False
-            
-            # Unmute microphone if enough time has passed
-            if self.microphone_muted and current_time - self.last_ai_audio_time >= self.ai_speech_delay:
-                self.microphone_muted = False
-                logger.info("🎙️ Microphone unmuted")
-            
-            return not self.microphone_muted
-        
-        elif self.strategy == "echo_cancellation":
-            # Always process but will apply echo cancellation
-            return True
-        
-        return True
+        arr = self._np.frombuffer(audio_data, dtype=self._np.int16)
+        if self._ref_resampler is not None:
+            arr = self._ref_resampler.process_array(arr)
+        size = self._ref_buf.size
+        if arr.size >= size:
+            arr = arr[-size:]
+        n = arr.size
+        end = self._ref_idx + n
+        if end <= size:
+            self._ref_buf[self._ref_idx:end] = arr
+        else:
+            # Wrap around the end of the ring buffer
+            split = size - self._ref_idx
+            self._ref_buf[self._ref_idx:] = arr[:split]
+            self._ref_buf[:n - split] = arr[split:]
+        self._ref_idx = end % size
     
     def process_microphone_audio(self, audio_data: bytes) -> Optional[bytes]:
-        """
-        Process microphone audio data based on current strategy.
-        Returns None if audio should be suppressed, otherwise returns processed audio.
-        """
-        if not self.should_process_microphone_input():
+        if self.manual_mute:
             return None
-        
-        if self.strategy == "api_handled":
-            # No client-side processing - let the API handle everything
-            return audio_data
-        
-        elif self.strategy == "echo_cancellation":
-            return self._apply_echo_cancellation(audio_data)
-        
-        return audio_data
+        return self._apply_echo_cancellation(audio_data)
     
     def _apply_echo_cancellation(self, audio_data: bytes) -> bytes:
-        """Placeholder echo cancellation - pass-through."""
-        logger.debug("Echo cancellation placeholder - no processing applied")
-        return audio_data
-    
-    def set_manual_mute(self, muted: bool):
-        """Manually mute/unmute the microphone."""
-        self.manual_mute = muted
-        logger.info(f"🎙️ Microphone {'muted' if muted else 'unmuted'} manually")
-    
-    def get_status(self) -> dict:
-        """Get current status of the feedback manager."""
-        return {
-            "strategy": self.strategy,
-            "ai_is_speaking": self.ai_is_speaking,
-            "microphone_muted": self.microphone_muted,
-            "manual_mute": self.manual_mute,
-            "push_to_talk_pressed": self.push_to_talk_pressed if self.strategy == "push_to_talk" else None,
-            "time_since_ai_stopped": time.time() - self.last_ai_audio_time if self.last_ai_audio_time > 0 else 0
-        }
+        """Cancel speaker echo from microphone audio with an NLMS adaptive filter."""
+        mic = self._np.frombuffer(audio_data, dtype=self._np.int16)
+        ref = self._reference_window(mic.size + self.echo_filter_taps - 1)
+        return self._nlms_step(mic, ref, self._echo_weights, self.echo_step_size).tobytes()
+
+    def _reference_window(self, n: int):
+        """Return the most recent n reference samples from the ring buffer, oldest first."""
+        start = self._ref_idx - n
+        if start >= 0:
+            return self._ref_buf[start:self._ref_idx]
+        return self._np.concatenate((self._ref_buf[start:], self._ref_buf[:self._ref_idx]))
+
+
+_STRATEGY_MAP = {
+    "api_handled": _ApiHandledFeedback,
+    "smart_muting": _SmartMutingFeedback,
+    "push_to_talk": _PushToTalkFeedback,
+    "echo_cancellation": _EchoCancelFeedback,
+}
 
 
 class AudioDeviceManager:
     """Helper class to manage audio devices and prevent feedback through device separation."""
     
+    _cached_devices = None
+
+    @classmethod
+    def list_audio_devices(cls, refresh: bool = False):
+        """List available audio devices, probing PortAudio only on first use or when refresh=True."""
+        if cls._cached_devices is None or refresh:
+            cls._cached_devices = cls._probe()
+        return cls._cached_devices
+    
     @staticmethod
-    def list_audio_devices():
-        """List available audio devices."""
-        audio = pyaudio.PyAudio()
-        devices = []
-        
+    def _probe():
+        """Query PortAudio for all audio devices."""
+        audio = get_pyaudio()
+        return [audio.get_device_info_by_index(i) for i in range(audio.get_device_count())]
+    
+    @staticmethod
+    def print_devices(devices):
+        """Print a device list as returned by list_audio_devices."""
         print("\n🎧 Available Audio Devices:")
         print("=" * 50)
         
-        for i in range(audio.get_device_count()):
-            device_info = audio.get_device_info_by_index(i)
-            devices.append(device_info)
-            
+        for device_info in devices:
             device_type = []
             if device_info['maxInputChannels'] > 0:
                 device_type.append("INPUT")
             if device_info['maxOutputChannels'] > 0:
                 device_type.append("OUTPUT")
             
-            print(f"Device {i}: {device_info['name']}")
+            print(f"Device {device_info['index']}: {device_info['name']}")
             print(f"  Type: {' & '.join(device_type)}")
             print(f"  Sample Rate: {device_info['defaultSampleRate']}")
             print(f"  Input Channels: {device_info['maxInputChannels']}")
             print(f"  Output Channels: {device_info['maxOutputChannels']}")
             print()
-        
-        audio.terminate()
-        return devices
     
     @staticmethod
     def get_device_recommendation():
@@ -1,14 +1,38 @@
+import asyncio
+import collections
 import logging
 import os
+import threading
+import time
 import wave
 from datetime import datetime
+from typing import Optional
 
 import pyaudio
 
-from audio_feedback_manager import AudioFeedbackManager
+from audio_feedback_manager import (
+    AudioFeedbackManager,
+    get_default_input_device_info,
+    get_pyaudio,
+    release_pyaudio,
+)
 
 logger = logging.getLogger(__name__)
 
+# Flush recorded mic audio to disk in blocks of at least this much audio
+RECORD_FLUSH_SECONDS = 1.0
+
+# Maximum seconds of AI audio waiting for playback. Far longer than any reply, so it only
+# guards against a stalled output device; audio beyond it is dropped with a warning
+MAX_OUTPUT_QUEUE_SECONDS = 120
+
+# Maximum number of captured mic chunks waiting to be sent; older chunks are dropped
+INPUT_RING_CHUNKS = 32
+
+# Maximum number of mic chunks waiting for the recording writer; recording is best-effort,
+# so a stalled disk loses the oldest unwritten audio rather than growing memory
+MAX_RECORD_QUEUE_CHUNKS = 1024
+
 
 class AudioManager:
     """Manages audio input/output streams and recording."""
@@ -20,10 +44,37 @@ class AudioManager:
         self.chunk = 1024  # Increased for better speech recognition
         self.native_rate = None  # Will store device's actual sample rate
         self.send_sample_rate = 16000  # Gemini Live API requirement
-        self.audio = pyaudio.PyAudio()
+        self.audio = get_pyaudio()  # Shared, so PortAudio is initialized once per process
         self.input_stream = None
         self.output_stream = None
         self.mic_record_file = None
+        self.capture_rate = None  # Rate the input stream was actually opened at
+        self._decimator = None  # In-process resampler when capturing above 16kHz
+
+        # Mic chunks delivered by the input stream callback. A bounded deque is a
+        # lock-free single-producer/single-consumer ring under the GIL: the callback
+        # appends (dropping the oldest when full) and only wakes the event loop when
+        # the reader is actually waiting, instead of scheduling a callback per chunk
+        self._input_ring = collections.deque(maxlen=INPUT_RING_CHUNKS)
+        self._input_loop = None
+        self._input_ready = None  # asyncio.Event; per setup_streams since each check-in has its own loop
+        self._input_waiting = False
+        self._input_closed = True  # No input stream open; read_input returns None
+        self._input_dropped = 0  # Chunks dropped since the last overflow warning
+        self._input_drop_logged_ns = 0
+
+        # AI audio waiting to be played by the output stream callback
+        self._out_queue = collections.deque()
+        self._out_pending = bytearray()
+        self._silence = b""  # Sized to one callback buffer on first use
+        self._out_dropped = 0  # Chunks dropped since the last overflow warning
+        self._out_drop_logged_ns = 0
+
+        # Mic recording is written by a background thread in large blocks
+        self._record_queue = collections.deque(maxlen=MAX_RECORD_QUEUE_CHUNKS)
+        self._record_thread = None
+        self._record_stop = threading.Event()
+        self._record_flush_bytes = 0  # RECORD_FLUSH_SECONDS at the recording rate; set by setup_streams
 
         # Audio feedback prevention
         self.feedback_manager = AudioFeedbackManager(strategy=feedback_strategy)
@@ -35,44 +86,77 @@ class AudioManager:
     def setup_streams(self):
         """Setup PyAudio input and output streams."""
         try:
+            # The input callback runs on PortAudio's thread and wakes readers on this loop
+            self._input_loop = asyncio.get_running_loop()
+            self._input_ready = asyncio.Event()
+            self._input_ring.clear()
+            self._input_closed = False
+
             # Get the default input device's native sample rate
-            default_input_device = self.audio.get_default_input_device_info()
+            default_input_device = get_default_input_device_info()
             self.native_rate = int(default_input_device['defaultSampleRate'])
             
             logger.info(f"Default input device: {default_input_device['name']}")
             logger.info(f"Native sample rate: {self.native_rate} Hz")
             logger.info(f"Using sample rate: {self.send_sample_rate} Hz for input (Gemini requirement)")
             
-            # Use 16kHz for input to match Gemini Live API requirement (like reference code)
-            try:
-                self.input_stream = self.audio.open(
-                    format=self.audio_format,
-                    channels=self.channels,
-                    rate=self.send_sample_rate,  # 16kHz
-                    input=True,
-                    frames_per_buffer=self.chunk
-                )
-                self.native_rate = self.send_sample_rate  # Update native rate to what we're actually using
-                logger.info(f"Successfully opened input stream at {self.send_sample_rate}Hz")
-            except Exception as e:
-                logger.warning(f"Failed to open stream at {self.send_sample_rate}Hz: {e}")
-                logger.info(f"Falling back to native rate: {self.native_rate}Hz")
-                # Fallback to native rate if 16kHz not supported
+            factor, remainder = divmod(self.native_rate, self.send_sample_rate)
+            if factor > 1 and remainder == 0:
+                # Capture at the native rate (e.g. 48kHz) and decimate to 16kHz ourselves,
+                # rather than leaving resampling quality and cost to the driver
                 self.input_stream = self.audio.open(
                     format=self.audio_format,
                     channels=self.channels,
                     rate=self.native_rate,
                     input=True,
-                    frames_per_buffer=self.chunk
+                    frames_per_buffer=self.chunk,
+                    stream_callback=self._in_cb
                 )
+                from audio_dsp import Decimator
+                self._decimator = Decimator(factor)
+                self.capture_rate = self.native_rate
+                self.native_rate = self.send_sample_rate  # Rate of audio leaving process_audio_input
+                logger.info(f"Capturing at {self.capture_rate}Hz, decimating by {factor} to {self.send_sample_rate}Hz")
+            else:
+                # Use 16kHz for input to match Gemini Live API requirement (like reference code)
+                self._decimator = None
+                try:
+                    self.input_stream = self.audio.open(
+                        format=self.audio_format,
+                        channels=self.channels,
+                        rate=self.send_sample_rate,  # 16kHz
+                        input=True,
+                        frames_per_buffer=self.chunk,
+                        stream_callback=self._in_cb
+                    )
+                    self.native_rate = self.send_sample_rate  # Update native rate to what we're actually using
+                    logger.info(f"Successfully opened input stream at {self.send_sample_rate}Hz")
+                except Exception as e:
+                    logger.warning(f"Failed to open stream at {self.send_sample_rate}Hz: {e}")
+                    logger.info(f"Falling back to native rate: {self.native_rate}Hz")
+                    # Fallback to native rate if 16kHz not supported
+                    self.input_stream = self.audio.open(
+                        format=self.audio_format,
+                        channels=self.channels,
+                        rate=self.native_rate,
+                        input=True,
+                        frames_per_buffer=self.chunk,
+                        stream_callback=self._in_cb
+                    )
+                self.capture_rate = self.native_rate
 
             self.output_stream = self.audio.open(
                 format=self.audio_format,
                 channels=self.channels,
                 rate=self.rate,
                 output=True,
-                frames_per_buffer=self.chunk
+                frames_per_buffer=self.chunk,
+                stream_callback=self._out_cb,
+                start=False
             )
+            # Echo cancellation compares the played AI audio against the mic after decimation
+            self.feedback_manager.set_sample_rates(self.rate, self.native_rate)
+            self.output_stream.start_stream()
 
             # Prepare directory for recordings
             recordings_dir = os.path.join(os.getcwd(), "recordings")
@@ -89,36 +173,165 @@ class AudioManager:
             self.mic_record_file.setsampwidth(2)  # paInt16 -> 2 bytes
             self.mic_record_file.setframerate(self.native_rate)  # Use native rate for recording
             logger.info(f"Mic audio will be recorded to {filename}")
+
+            # Start background writer for the recording
+            self._record_flush_bytes = int(self.native_rate * self.channels * 2 * RECORD_FLUSH_SECONDS)
+            self._record_stop.clear()
+            self._record_thread = threading.Thread(target=self._record_writer_loop, daemon=True)
+            self._record_thread.start()
             logger.info("Audio streams initialized")
 
         except Exception as e:
             logger.error(f"Failed to setup audio streams: {e}")
             raise
 
+    def _in_cb(self, in_data, frame_count, time_info, status):
+        """PyAudio input callback - append the captured chunk to the input ring."""
+        ring = self._input_ring
+        if len(ring) == INPUT_RING_CHUNKS:
+            # Sustained overflow means the network can't keep up; say so at most once a second
+            self._input_dropped += 1
+            now = time.monotonic_ns()
+            if now - self._input_drop_logged_ns >= 1_000_000_000:
+                logger.warning(f"Mic input ring full - dropped {self._input_dropped} stale chunk(s)")
+                self._input_dropped = 0
+                self._input_drop_logged_ns = now
+        ring.append(in_data)  # deque(maxlen) drops the oldest chunk itself
+        if self._input_waiting:
+            try:
+                self._input_loop.call_soon_threadsafe(self._input_ready.set)
+            except RuntimeError:
+                pass  # Event loop already closed; the stream is about to be stopped
+        return (None, pyaudio.paContinue)
+
+    async def read_input(self) -> Optional[bytes]:
+        """Return the next captured mic chunk, waiting for the input callback if none is queued.
+
+        Returns None once the input stream has been closed.
+        """
+        ring = self._input_ring
+        while not ring:
+            if self._input_closed:
+                return None
+            self._input_ready.clear()
+            self._input_waiting = True
+            # Re-check after publishing the flag, so a chunk appended just before it isn't missed
+            if not ring and not self._input_closed:
+                await self._input_ready.wait()
+            self._input_waiting = False
+        return ring.popleft()
+
     def process_audio_input(self, audio_data: bytes) -> bytes:
-        """Process audio input through feedback manager and record to file."""
-        # Use feedback manager to process audio
-        processed_audio = self.feedback_manager.process_microphone_audio(audio_data)
+        """Process audio input through feedback manager and record to file.
+
+        audio_data may be any bytes-like object; it is only ever read through
+        the buffer protocol, so callers can pass a memoryview without copying.
+        """
+        feedback = self.feedback_manager
+        keep = feedback.should_process_microphone_input()
+
+        # Decimate every chunk, even suppressed ones, so the filter history stays continuous
+        if self._decimator:
+            audio_data = self._decimator.process(audio_data)
+        if not keep:
+            return None
+
+        # Feedback processing (e.g. echo cancellation) runs at the rate we send
+        processed_audio = feedback.process_microphone_audio(audio_data)
         if processed_audio is None:
-            return None  # Audio suppressed by feedback manager
+            return None
 
-        # Save to recording file
+        # Queue for the recording writer thread
         if self.mic_record_file:
-            try:
-                self.mic_record_file.writeframes(processed_audio)
-            except Exception as rec_err:
-                logger.warning(f"Failed to write mic audio: {rec_err}")
+            self._record_queue.append(processed_audio)
 
         return processed_audio
 
+    def _record_writer_loop(self):
+        """Drain queued mic audio and write it to the recording file in large blocks."""
+        pending = []
+        pending_bytes = 0
+        while True:
+            stopping = self._record_stop.wait(0.5)
+            while self._record_queue:
+                chunk = self._record_queue.popleft()
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+
+            if pending and (stopping or pending_bytes >= self._record_flush_bytes):
+                try:
+                    # writeframesraw skips the per-call header rewrite; close() patches it once
+                    self.mic_record_file.writeframesraw(b"".join(pending))
+                except Exception as rec_err:
+                    logger.warning(f"Failed to write mic audio: {rec_err}")
+                pending.clear()
+                pending_bytes = 0
+
+            if stopping:
+                break
+
+    def _out_cb(self, in_data, frame_count, time_info, status):
+        """PyAudio output callback - feed queued AI audio, padding with silence on underrun."""
+        needed = frame_count * self.channels * 2  # paInt16 -> 2 bytes
+        if len(self._silence) != needed:
+            self._silence = bytes(needed)
+        pending = self._out_pending
+        while len(pending) < needed and self._out_queue:
+            pending += self._out_queue.popleft()
+
+        if not pending:
+            chunk = self._silence
+        else:
+            if len(pending) < needed:
+                pending += memoryview(self._silence)[len(pending):]
+            # Copy straight out of the pending buffer; the view must be released before resizing it
+            with memoryview(pending) as view:
+                chunk = bytes(view[:needed])
+            del pending[:needed]
+
+        # The echo reference advances with what is actually played, silence included,
+        # so it stays aligned with the mic
+        if self.feedback_manager.echo_cancellation_enabled:
+            self.feedback_manager.add_reference_audio(chunk)
+        return (chunk, pyaudio.paContinue)
+
     def play_audio_output(self, audio_bytes: bytes):
-        """Play audio output and track AI speaking state."""
+        """Queue audio output for playback and track AI speaking state."""
         if self.output_stream:
-            self.output_stream.write(audio_bytes)
+            # The speaking deadline already tracks how much queued audio is left to play
+            now = time.monotonic_ns()
+            if self.feedback_manager._ai_playback_end_ns - now >= MAX_OUTPUT_QUEUE_SECONDS * 1_000_000_000:
+                self._out_dropped += 1
+                if now - self._out_drop_logged_ns >= 1_000_000_000:
+                    logger.warning(f"Output queue holds over {MAX_OUTPUT_QUEUE_SECONDS}s of audio - "
+                                   f"dropped {self._out_dropped} AI audio chunk(s)")
+                    self._out_dropped = 0
+                    self._out_drop_logged_ns = now
+                return
+            self._out_queue.append(audio_bytes)
+
+        # Use feedback manager to track AI speaking for as long as this chunk plays
+        duration_ns = len(audio_bytes) * 500_000_000 // (self.rate * self.channels)  # 2 bytes per sample
+        self.feedback_manager.mark_ai_speaking_start(duration_ns)
 
-        # Use feedback manager to track AI speaking
-        self.feedback_manager.mark_ai_speaking_start()
-        self.feedback_manager.add_reference_audio(audio_bytes)
+    def _playback_pending(self) -> bool:
+        """Whether queued AI audio has yet to reach the speakers."""
+        if not self.output_stream:
+            return False
+        return bool(self._out_queue or self._out_pending) or self.feedback_manager.ai_is_speaking
+
+    async def wait_for_playback(self, timeout: float):
+        """Wait until queued AI audio has played out, but never longer than timeout seconds."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._playback_pending():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.info("🔊 Playback still pending at disconnect timeout")
+                return
+            # Sleep until the estimated end of playback, re-checking at least every 100ms
+            until_end = (self.feedback_manager._ai_playback_end_ns - time.monotonic_ns()) / 1e9
+            await asyncio.sleep(min(remaining, max(until_end, 0.02), 0.1))
 
     def mark_ai_speaking_end(self):
         """Mark that AI has finished speaking."""
@@ -131,14 +344,32 @@ class AudioManager:
             self.input_stream.stop_stream()
             self.input_stream.close()
             self.input_stream = None
+            self._input_ring.clear()
+
+        # Wake a reader blocked in read_input so it sees the stream is gone
+        self._input_closed = True
+        if self._input_loop is not None:
+            try:
+                self._input_loop.call_soon_threadsafe(self._input_ready.set)
+            except RuntimeError:
+                pass  # Event loop already closed - nobody is waiting
 
         if self.output_stream:
             logger.info("🔌 Closing output audio stream")
             self.output_stream.stop_stream()
             self.output_stream.close()
             self.output_stream = None
+            self._out_queue.clear()
+            self._out_pending.clear()
+
+        # Flush remaining audio and stop the recording writer
+        if self._record_thread:
+            self._record_stop.set()
+            self._record_thread.join()
+            self._record_thread = None
 
-        # Close recording file
+        # Close recording file - close() patches the RIFF/data sizes in the header once,
+        # which is what makes the raw writes above safe
         if self.mic_record_file:
             try:
                 self.mic_record_file.close()
@@ -151,4 +382,4 @@ class AudioManager:
     def terminate(self):
         """Terminate audio system."""
         if hasattr(self, 'audio'):
-            self.audio.terminate() 
\ No newline at end of file
+            release_pyaudio()
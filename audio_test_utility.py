@@ -26,7 +26,7 @@ def main():
         choice = input("\nEnter your choice (1-7): ").strip()
         
         if choice == "1":
-            AudioDeviceManager.list_audio_devices()
+            AudioDeviceManager.print_devices(AudioDeviceManager.list_audio_devices(refresh=True))
             
         elif choice == "2":
             AudioDeviceManager.get_device_recommendation()
@@ -61,12 +61,13 @@ def test_smart_muting():
     
     print("\nSimulating AI speaking cycle...")
     
-    # Simulate AI starting to speak
+    # Simulate AI starting to speak - speaking state lasts as long as the queued audio
+    speech_seconds = 2
     print("🤖 AI started speaking...")
-    manager.mark_ai_speaking_start()
+    manager.mark_ai_speaking_start(duration_ns=speech_seconds * 1_000_000_000)
     print(f"Status: {manager.get_status()}")
     
-    time.sleep(2)
+    time.sleep(speech_seconds)
     
     # Simulate AI finishing speaking
     print("🤖 AI finished speaking...")
@@ -160,7 +161,7 @@ def test_device_separation():
     print("=" * 40)
     print("Using different devices for input and output prevents feedback.")
     
-    AudioDeviceManager.list_audio_devices()
+    AudioDeviceManager.print_devices(AudioDeviceManager.list_audio_devices())
     
     print("\n💡 Recommendations:")
     print("- Use headphones (output device) to completely eliminate feedback")
@@ -4,9 +4,18 @@ Dependency checker for Voice Check Agent.
 This script verifies that all required dependencies are installed with correct versions.
 """
 
+import re
 import sys
 import importlib
-import pkg_resources
+from concurrent.futures import ThreadPoolExecutor
+from importlib.metadata import version, PackageNotFoundError
+
+try:
+    from packaging.version import Version as parse_version
+except ImportError:
+    def parse_version(value):
+        """Minimal fallback: compare the leading numeric release components."""
+        return tuple(int(part) for part in re.findall(r'\d+', value.split('+')[0])[:3])
 
 def check_python_version():
     """Check Python version."""
@@ -20,57 +29,75 @@ def check_python_version():
         print("✅ Python version is compatible")
         return True
 
-def check_package(package_name, min_version=None):
-    """Check if a package is installed with the correct version."""
+def _check_package(package_name, min_version=None):
+    """Check a package without printing; returns (ok, report_lines)."""
+    lines = []
     try:
         # Try to import the package
         module = importlib.import_module(package_name)
         
         # Get installed version
         try:
-            installed_version = pkg_resources.get_distribution(package_name).version
-        except pkg_resources.DistributionNotFound:
+            installed_version = version(package_name)
+        except PackageNotFoundError:
             installed_version = getattr(module, '__version__', 'unknown')
         
-        print(f"✅ {package_name}: {installed_version}")
+        lines.append(f"✅ {package_name}: {installed_version}")
         
         # Check minimum version if specified
         if min_version and installed_version != 'unknown':
             try:
-                if pkg_resources.parse_version(installed_version) < pkg_resources.parse_version(min_version):
-                    print(f"⚠️  {package_name} version {installed_version} is below minimum {min_version}")
-                    return False
+                if parse_version(installed_version) < parse_version(min_version):
+                    lines.append(f"⚠️  {package_name} version {installed_version} is below minimum {min_version}")
+                    return False, lines
             except:
                 pass
         
-        return True
+        return True, lines
         
     except ImportError:
-        print(f"❌ {package_name}: Not installed")
-        return False
+        lines.append(f"❌ {package_name}: Not installed")
+        return False, lines
     except Exception as e:
-        print(f"❌ {package_name}: Error checking - {e}")
-        return False
+        lines.append(f"❌ {package_name}: Error checking - {e}")
+        return False, lines
+
+def check_package(package_name, min_version=None):
+    """Check if a package is installed with the correct version."""
+    ok, lines = _check_package(package_name, min_version)
+    print("\n".join(lines))
+    return ok
 
 def check_audio_devices():
     """Check audio device availability."""
     try:
-        import pyaudio
-        
-        audio = pyaudio.PyAudio()
+        from audio_feedback_manager import get_default_device_indices, get_pyaudio, release_pyaudio
         
-        input_count = 0
-        output_count = 0
-        
-        for i in range(audio.get_device_count()):
-            info = audio.get_device_info_by_index(i)
-            if info['maxInputChannels'] > 0:
-                input_count += 1
-            if info['maxOutputChannels'] > 0:
-                output_count += 1
+        try:
+            # A default input and output device is all the agent needs, and asking the
+            # host API for them avoids enumerating every (possibly virtual) device
+            try:
+                default_input, default_output = get_default_device_indices()
+                if default_input >= 0 and default_output >= 0:
+                    print("✅ Audio devices: default input and output available")
+                    return True
+            except Exception:
+                pass
+            
+            audio = get_pyaudio()
+            input_count = 0
+            output_count = 0
+            
+            for i in range(audio.get_device_count()):
+                info = audio.get_device_info_by_index(i)
+                if info['maxInputChannels'] > 0:
+                    input_count += 1
+                if info['maxOutputChannels'] > 0:
+                    output_count += 1
+        finally:
+            release_pyaudio()
         
         print(f"✅ Audio devices: {input_count} input, {output_count} output")
-        audio.terminate()
         
         if input_count == 0:
             print("⚠️  No microphone devices found")
@@ -111,10 +138,10 @@ def main():
     # Required packages with minimum versions
     packages = [
         ('aiohttp', '3.8.0'),
-        ('websockets', '11.0.0'),
         ('pyaudio', '0.2.11'),
         ('openai', '1.0.0'),
         ('dotenv', '1.0.0'),
+        ('numba', '0.56.0'),
     ]
     
     print("\n📋 Checking Python version...")
@@ -122,8 +149,12 @@ def main():
         all_good = False
     
     print("\n📦 Checking Python packages...")
-    for package, min_version in packages:
-        if not check_package(package, min_version):
+    # Imports overlap well across threads; results are printed afterwards in list order
+    with ThreadPoolExecutor(max_workers=len(packages)) as executor:
+        results = list(executor.map(lambda pv: _check_package(*pv), packages))
+    for ok, lines in results:
+        print("\n".join(lines))
+        if not ok:
             all_good = False
     
     print("\n🔊 Checking audio devices...")
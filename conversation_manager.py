@@ -1,29 +1,45 @@
-import json
 import logging
 import os
+import time
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Any
+from itertools import islice
+from typing import Deque, Dict, Any
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
+_ROLE_TITLES = {'user': 'User', 'assistant': 'Assistant', 'system': 'System'}
+
+
+def _for_file(msg: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a history record in its saved form, with an ISO 8601 'timestamp'."""
+    record = {'timestamp': datetime.fromtimestamp(msg['ts']).isoformat()}
+    record.update((k, v) for k, v in msg.items() if k != 'ts')
+    return record
+
 
 class ConversationManager:
     """Manages conversation history and formatting."""
 
     def __init__(self):
-        self.conversation_history: List[Dict[str, Any]] = []
+        # Keep only last 500 messages to manage memory; the deque drops the oldest itself
+        self.conversation_history: Deque[Dict[str, Any]] = deque(maxlen=500)
+        # When set, every message is also appended to this JSON-lines file as it arrives
+        self.journal_file = None
 
     def add_to_history(self, role: str, content: str):
         """Add a message to conversation history."""
-        self.conversation_history.append({
-            'timestamp': datetime.now().isoformat(),
+        # Raw epoch seconds; formatted as ISO 8601 only when the history is saved
+        message = {
+            'ts': time.time(),
             'role': role,
             'content': content
-        })
-
-        # Keep only last 500 messages to manage memory
-        if len(self.conversation_history) > 500:
-            self.conversation_history = self.conversation_history[-500:]
+        }
+        self.conversation_history.append(message)
+        if self.journal_file is not None:
+            self.append_to_file(message, self.journal_file)
 
     def format_history_for_prompt(self) -> str:
         """Formats the conversation history to be included in the system prompt."""
@@ -31,38 +47,63 @@ class ConversationManager:
             return ""
 
         # Let's take the last 10 messages to avoid a very long prompt
-        recent_history = self.conversation_history[-10:]
+        recent_history = islice(self.conversation_history, max(0, len(self.conversation_history) - 10), None)
+
+        parts = ["\n\n--- Previous Conversation Summary ---\n"]
+        # Use title case for roles
+        parts.extend(
+            f"{_ROLE_TITLES.get(msg['role']) or msg['role'].title()}: {msg['content']}\n"
+            for msg in recent_history
+        )
+        parts.append("--- End of Conversation Summary ---\n")
+        return "".join(parts)
+
+    def _resolve_path(self, filename: str) -> str:
+        """Place bare filenames in the histories directory and make sure parent directories exist."""
+        # Ensure a dedicated directory exists for conversation history files
+        histories_dir = os.path.join(os.getcwd(), "conversation_histories")
+        os.makedirs(histories_dir, exist_ok=True)
+
+        # If a bare filename (no path) is provided, place it in the histories directory
+        if not os.path.isabs(filename) and os.path.dirname(filename) == "":
+            return os.path.join(histories_dir, filename)
 
-        formatted_history = "\n\n--- Previous Conversation Summary ---\n"
-        for msg in recent_history:
-            # Use title case for roles
-            role = msg["role"].title()
-            formatted_history += f"{role}: {msg['content']}\n"
-        formatted_history += "--- End of Conversation Summary ---\n"
-        return formatted_history
+        # If a path is provided, make sure its parent directories exist
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        return filename
 
     def save_to_file(self, filename: str = None):
         """Save conversation history to a JSON file."""
         # Debug logging
         logger.info(f"💾 ConversationManager.save_to_file called with {len(self.conversation_history)} messages")
 
-        # Ensure a dedicated directory exists for conversation history files
-        histories_dir = os.path.join(os.getcwd(), "conversation_histories")
-        os.makedirs(histories_dir, exist_ok=True)
-
         # Generate default filename when none provided
         if filename is None:
             filename = f"conversation_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        filename = self._resolve_path(filename)
 
-        # If a bare filename (no path) is provided, place it in the histories directory
-        if not os.path.isabs(filename) and os.path.dirname(filename) == "":
-            filename = os.path.join(histories_dir, filename)
-        else:
-            # If a path is provided, make sure its parent directories exist
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # Write the conversation history to the JSON file straight to the fd, no Python buffering
+        payload = orjson.dumps([_for_file(msg) for msg in self.conversation_history],
+                               option=orjson.OPT_INDENT_2)
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+
+        logger.info(f"💾 Conversation history saved to {filename} with {len(self.conversation_history)} messages")
 
-        # Write the conversation history to the JSON file
-        with open(filename, 'w') as f:
-            json.dump(self.conversation_history, f, indent=2)
+    def append_to_file(self, message: Dict[str, Any], filename: str = None):
+        """Append a single message to a JSON-lines history file.
+
+        Unlike save_to_file this only serializes the new message, so it can be
+        called after every add_to_history without rewriting the whole history.
+        """
+        if filename is None:
+            filename = f"conversation_history_{datetime.now().strftime('%Y%m%d')}.jsonl"
+        filename = self._resolve_path(filename)
 
-        logger.info(f"💾 Conversation history saved to {filename} with {len(self.conversation_history)} messages") 
\ No newline at end of file
+        with open(filename, 'ab') as f:
+            f.write(orjson.dumps(_for_file(message), option=orjson.OPT_APPEND_NEWLINE))
@@ -3,25 +3,129 @@ Google Gemini Live Streaming API implementation.
 """
 
 import asyncio
-import json
 import logging
-import base64
 import io
+import threading
+import time
 from typing import Dict, Any, Optional, AsyncIterator, List
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 
 from google import genai
 from google.genai import types
 import mss
 from PIL import Image
+import orjson
 import numpy as np
-import soundfile as sf
-import librosa
 
 from api_manager_base import RealtimeAPIManager, APIMessage
 
 logger = logging.getLogger(__name__)
 
+# Gemini Live expects 16-bit PCM at this rate
+GEMINI_INPUT_RATE = 16000
+
+
+# Upper bound on received messages waiting for the agent
+MESSAGE_QUEUE_MAXSIZE = 64
+
+# Audio traffic is logged as a summary every this many chunks instead of per chunk
+AUDIO_STATS_INTERVAL = 100
+
+# Consecutive received audio chunks are merged into one message of up to this
+# many bytes (200 ms of 24 kHz PCM16), or until the first merged chunk is this old
+AUDIO_COALESCE_BYTES = 9600
+AUDIO_COALESCE_MAX_NS = 60_000_000
+
+# JPEG quality for screenshots sent to the model
+SCREENSHOT_JPEG_QUALITY = 80
+
+
+class _MessageQueue(asyncio.Queue):
+    """Bounded message queue that makes room for new audio by dropping the oldest audio chunk."""
+
+    def put_audio_nowait(self, message: APIMessage):
+        """Queue an audio message without waiting, dropping stale audio if the queue is full."""
+        try:
+            self.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+        # Only audio is ever dropped; control messages keep their place and order.
+        # Cycle the queue through get_nowait/put_nowait so its bookkeeping stays intact
+        kept = []
+        dropped = False
+        while not self.empty():
+            queued = self.get_nowait()
+            self.task_done()
+            if not dropped and queued is not None and queued.message_type == 'audio':
+                dropped = True
+                continue
+            kept.append(queued)
+        if dropped:
+            kept.append(message)
+        for queued in kept:
+            self.put_nowait(queued)
+        if dropped:
+            logger.debug("Message queue full - dropped oldest audio chunk")
+        else:
+            logger.debug("Message queue full of control messages - dropped incoming audio chunk")
+
+    def close_nowait(self):
+        """Queue the end-of-stream marker, evicting the oldest message if the queue is full."""
+        if self.full():
+            self.get_nowait()
+        self.put_nowait(None)
+
+
+# mss handles are bound to the thread that created them, so keep one capture handle per thread
+_screen_capture = threading.local()
+
+# One long-lived worker for capture + encode; unlike the per-loop default executor
+# it survives across check-in cycles, so its mss handle is reused
+_screenshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot")
+
+
+def _get_screen_capture():
+    """Return this thread's mss instance and primary monitor, creating them on first use."""
+    sct = getattr(_screen_capture, 'sct', None)
+    if sct is None:
+        sct = _screen_capture.sct = mss.mss()
+        _screen_capture.monitor = sct.monitors[1]  # 0 is all monitors, 1 is primary
+    return sct, _screen_capture.monitor
+
+
+def _capture_screenshot() -> types.Blob:
+    """Grab the primary monitor as a JPEG Blob; runs on the screenshot thread.
+
+    Encoding here keeps the JPEG work off the event loop - handing send_realtime_input
+    a PIL Image would make the SDK encode it on the loop instead.
+    """
+    # Capture the primary monitor
+    sct, monitor = _get_screen_capture()
+    screenshot = sct.grab(monitor)
+
+    # Convert to PIL Image - let PIL's raw decoder swap BGRX -> RGB in C in one
+    # pass, instead of mss's pure-Python .rgb conversion or a strided numpy copy
+    img = Image.frombuffer('RGB', screenshot.size, screenshot.bgra, 'raw', 'BGRX', 0, 1)
+
+    # Resize if too large (Gemini has size limits); bilinear is plenty for a screen capture
+    max_size = (1920, 1080)
+    if img.width > max_size[0] or img.height > max_size[1]:
+        img.thumbnail(max_size, Image.Resampling.BILINEAR)
+
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=SCREENSHOT_JPEG_QUALITY)
+    logger.info(f"Screenshot captured: {img.size}, {buf.tell()} bytes")
+    return types.Blob(data=buf.getvalue(), mime_type="image/jpeg")
+
+
+@lru_cache(maxsize=4)
+def _gemini_tools(tools_json: bytes) -> List[types.Tool]:
+    """Convert tools (given as key-sorted JSON) to Gemini declarations, once per distinct schema."""
+    return GeminiLiveManager._convert_tools_to_gemini_format(orjson.loads(tools_json))
+
 
 class GeminiLiveManager(RealtimeAPIManager):
     """Manages Google Gemini Live Streaming API connections."""
@@ -36,9 +140,29 @@ class GeminiLiveManager(RealtimeAPIManager):
         self._session_context = None
         self.model = "gemini-2.5-flash-preview-native-audio-dialog"
         self.audio_input_queue = asyncio.Queue()
-        self.message_queue = asyncio.Queue()
+        self.message_queue = _MessageQueue(maxsize=MESSAGE_QUEUE_MAXSIZE)
         self._receive_task = None
 
+        # Streaming resampler to 16kHz for the current session and source rate; it carries
+        # filter state across chunks so chunk boundaries don't produce artifacts
+        self._resampler = None
+        self._resampler_rate = None
+
+        # Audio traffic counters for the periodic stats log
+        self._audio_chunks_sent = 0
+        self._audio_bytes_sent = 0
+        self._audio_chunks_received = 0
+        self._audio_bytes_received = 0
+
+        # The voice never changes, and the system prompt rarely does between sessions
+        self._speech_config = types.SpeechConfig(
+            voice_config=types.VoiceConfig(
+                prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name="Zephyr")
+            )
+        )
+        self._system_prompt: Optional[str] = None
+        self._system_content: Optional[types.Content] = None
+
     async def create_session(self) -> str:
         """Create a new Gemini session and return session identifier."""
         # Gemini doesn't require pre-creating sessions like OpenAI
@@ -50,6 +174,9 @@ class GeminiLiveManager(RealtimeAPIManager):
         """Connect to Gemini Live API."""
         try:
             # We'll establish the actual connection when configuring the session
+            # Fresh queue per connection so no messages (or close marker) carry over
+            self.message_queue = _MessageQueue(maxsize=MESSAGE_QUEUE_MAXSIZE)
+            self._resampler = None  # Filter state doesn't carry over between sessions
             self.is_connected = True
             logger.info("Ready to connect to Gemini Live API")
             return True
@@ -59,6 +186,7 @@ class GeminiLiveManager(RealtimeAPIManager):
 
     async def disconnect(self):
         """Disconnect from Gemini Live API."""
+        self._reset_audio_batch()
         if self._receive_task and not self._receive_task.done():
             self._receive_task.cancel()
             try:
@@ -76,25 +204,27 @@ class GeminiLiveManager(RealtimeAPIManager):
             self._session_context = None
             
         self.is_connected = False
+        # Wake up receive_messages so consumers see the end of the stream
+        self.message_queue.close_nowait()
         logger.info("Disconnected from Gemini Live API")
 
     async def configure_session(self, system_prompt: str, tools: List[Dict[str, Any]], **kwargs):
         """Configure and start the Gemini session."""
-        # Convert tools to Gemini format
-        gemini_tools = self._convert_tools_to_gemini_format(tools)
+        # Convert tools to Gemini format - cached by schema, so this is free after the first session
+        gemini_tools = _gemini_tools(orjson.dumps(tools, option=orjson.OPT_SORT_KEYS))
         
-        config = types.LiveConnectConfig(
-            response_modalities=["AUDIO"],
-            speech_config=types.SpeechConfig(
-                voice_config=types.VoiceConfig(
-                    prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name="Zephyr")
-                )
-            ),
-            tools=gemini_tools,
-            system_instruction=types.Content(
+        if system_prompt != self._system_prompt:
+            self._system_content = types.Content(
                 parts=[types.Part(text=system_prompt)],
                 role="user"
             )
+            self._system_prompt = system_prompt
+        
+        config = types.LiveConnectConfig(
+            response_modalities=["AUDIO"],
+            speech_config=self._speech_config,
+            tools=gemini_tools,
+            system_instruction=self._system_content
         )
         
         # Start the session using async context manager
@@ -109,39 +239,49 @@ class GeminiLiveManager(RealtimeAPIManager):
         
         logger.info("Configured Gemini Live session")
 
-    async def send_audio(self, audio_data: bytes, source_sample_rate: int = 24000):
+    async def _send_audio_chunk(self, audio_data: bytes, source_sample_rate: int):
         """Send audio data to Gemini."""
         if not self.session:
             return
             
+        # Deferred so importing this module (as api_manager always does) doesn't load numba
+        from audio_dsp import Resampler, rms_exceeds, rms_i16
+
+        debug = logger.isEnabledFor(logging.DEBUG)
         try:
             # Gemini expects 16-bit PCM at 16kHz
             # Input could be at various sample rates (24kHz, 48kHz), so we need to resample
-            audio_array = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
+            samples = np.frombuffer(audio_data, dtype=np.int16)
             
-            # Check if audio contains actual signal (not silence)
-            audio_rms = np.sqrt(np.mean(audio_array ** 2))
-            if audio_rms < 0.001:  # Very quiet audio, might be silence
-                logger.debug(f"Audio chunk RMS: {audio_rms:.6f} (very quiet, skipping)")
+            # Check if audio contains actual signal (not silence), relative to int16 full scale.
+            # Works on the raw samples and stops as soon as a prefix proves there is signal
+            has_signal = rms_exceeds(samples, 0.001)
+            if debug:
+                logger.debug("Audio chunk RMS: %.6f (%s)", rms_i16(samples),
+                             "has signal" if has_signal else "very quiet, skipping")
+            if not has_signal:  # Very quiet audio, might be silence
                 return  # Skip sending silent audio
-            else:
-                logger.debug(f"Audio chunk RMS: {audio_rms:.6f} (has signal)")
             
-            # Only resample if needed
-            if source_sample_rate != 16000:
-                logger.debug(f"Resampling audio from {source_sample_rate}Hz to 16kHz")
-                audio_16khz = librosa.resample(audio_array, orig_sr=source_sample_rate, target_sr=16000)
+            # Only resample if needed (e.g. 2/3 for 24kHz, 1/3 for 48kHz)
+            if source_sample_rate != GEMINI_INPUT_RATE:
+                if debug:
+                    logger.debug("Resampling audio from %dHz to 16kHz", source_sample_rate)
+                if self._resampler is None or self._resampler_rate != source_sample_rate:
+                    self._resampler = Resampler(source_sample_rate, GEMINI_INPUT_RATE)
+                    self._resampler_rate = source_sample_rate
+                audio_bytes = self._resampler.process_array(samples).tobytes()
             else:
-                audio_16khz = audio_array
-            
-            # Convert back to int16
-            audio_16khz_int16 = (audio_16khz * 32768).astype(np.int16)
-            audio_bytes = audio_16khz_int16.tobytes()
+                # Already 16 kHz int16 PCM - forward the caller's bytes untouched
+                audio_bytes = audio_data
             
             # Send audio using session.send() with raw data format (like reference code)
             audio_msg = {"data": audio_bytes, "mime_type": "audio/pcm"}
             await self.session.send(input=audio_msg)
-            logger.debug(f"Sent {len(audio_bytes)} bytes of audio to Gemini")
+            self._audio_bytes_sent += len(audio_bytes)
+            self._audio_chunks_sent += 1
+            if self._audio_chunks_sent % AUDIO_STATS_INTERVAL == 0:
+                logger.debug("Sent %d audio chunks (%d bytes) to Gemini",
+                             self._audio_chunks_sent, self._audio_bytes_sent)
         except Exception as e:
             if "keepalive ping timeout" in str(e) or "ConnectionClosedError" in str(e):
                 logger.warning(f"WebSocket connection lost: {e}")
@@ -159,7 +299,13 @@ class GeminiLiveManager(RealtimeAPIManager):
         # Add screenshot if requested
         if image_data is None and "check on me" in text.lower():
             logger.info("Taking screenshot for 'check on me' request")
-            image_data = await self._take_screenshot()
+            img = await self._take_screenshot()
+        elif image_data:
+            # Caller supplied encoded bytes - pass them through, reading only the header for the type
+            fmt = Image.open(io.BytesIO(image_data)).format
+            img = types.Blob(data=image_data, mime_type=Image.MIME.get(fmt, "image/jpeg"))
+        else:
+            img = None
         
         try:
             # Send text first
@@ -174,10 +320,8 @@ class GeminiLiveManager(RealtimeAPIManager):
             logger.info("Sent text message successfully")
             
             # Send image using send_realtime_input if we have one
-            if image_data:
+            if img is not None:
                 logger.info("Sending screenshot using send_realtime_input")
-                # Convert to PIL Image for send_realtime_input
-                img = Image.open(io.BytesIO(image_data))
                 await self.session.send_realtime_input(media=img)
                 logger.info("Sent screenshot successfully")
             
@@ -202,6 +346,8 @@ class GeminiLiveManager(RealtimeAPIManager):
         while True:
             try:
                 message = await self.message_queue.get()
+                if message is None:
+                    break  # Session disconnected
                 yield message
             except asyncio.CancelledError:
                 break
@@ -233,20 +379,10 @@ class GeminiLiveManager(RealtimeAPIManager):
                 function_responses.append(function_response)
                 logger.info(f"🔧 Converted to Gemini format: {function_response}")
             
-            # Try the format without wrapping in functionResponses
+            # Try the format without wrapping in functionResponses; the sends
+            # are issued concurrently rather than one round-trip at a time
             logger.info(f"🔧 SENDING INDIVIDUAL FUNCTION RESPONSES")
-            for func_response in function_responses:
-                try:
-                    logger.info(f"🔧 Sending individual response: {json.dumps(func_response, indent=2)}")
-                    await self.session.send_tool_response(func_response)
-                    logger.info("🔧 ✅ Individual response sent successfully")
-                except Exception as e:
-                    logger.error(f"🔧 ❌ Error sending individual response: {e}")
-                    # Try alternative format wrapped in functionResponses
-                    logger.info("🔧 Trying wrapped format...")
-                    gemini_response = {"functionResponses": [func_response]}
-                    await self.session.send_tool_response(gemini_response)
-                    logger.info("🔧 ✅ Wrapped response sent successfully")
+            await asyncio.gather(*[self._send_function_response(fr) for fr in function_responses])
             logger.info("🔧 ✅ TOOL RESPONSE SENT TO GEMINI SUCCESSFULLY")
             
         except Exception as e:
@@ -256,71 +392,129 @@ class GeminiLiveManager(RealtimeAPIManager):
             # Raise KeyboardInterrupt to stop the agent for debugging
             raise KeyboardInterrupt(f"API Error in send_tool_response: {e}")
 
+    async def _send_function_response(self, func_response: Dict[str, Any]):
+        """Send one function response, retrying wrapped in functionResponses if rejected."""
+        try:
+            logger.info(f"🔧 Sending individual response: {orjson.dumps(func_response, option=orjson.OPT_INDENT_2, default=str).decode()}")
+            await self.session.send_tool_response(func_response)
+            logger.info("🔧 ✅ Individual response sent successfully")
+        except Exception as e:
+            logger.error(f"🔧 ❌ Error sending individual response: {e}")
+            # Try alternative format wrapped in functionResponses
+            logger.info("🔧 Trying wrapped format...")
+            gemini_response = {"functionResponses": [func_response]}
+            await self.session.send_tool_response(gemini_response)
+            logger.info("🔧 ✅ Wrapped response sent successfully")
+
     async def _receive_loop(self):
         """Background task to receive messages from Gemini."""
+        # Bind the queue methods once rather than per response
+        put = self.message_queue.put
+        put_audio = self.message_queue.put_audio_nowait
+
+        # Received audio not yet queued, and when its first chunk arrived
+        audio_accum = bytearray()
+        audio_started_ns = 0
+        # Flushes a lone or trailing chunk once it is AUDIO_COALESCE_MAX_NS old, even if
+        # no further server message arrives to trigger the check below
+        loop = asyncio.get_running_loop()
+        flush_timer = None
+
+        def flush_audio():
+            nonlocal flush_timer
+            if flush_timer is not None:
+                flush_timer.cancel()
+                flush_timer = None
+            if audio_accum:
+                put_audio(APIMessage(
+                    message_type='audio',
+                    audio_data=bytes(audio_accum),
+                    metadata={'sample_rate': 24000}
+                ))
+                audio_accum.clear()
+
         try:
             while True:
                 # Get the next turn from the session (like reference code)
                 turn = self.session.receive()
                 async for response in turn:
-                    # Debug log to see response structure
-                    logger.debug(f"Received response type: {type(response)}")
-                    
+                    server_content = getattr(response, 'server_content', None)
+
                     # Handle audio data directly from response.data
-                    if hasattr(response, 'data') and response.data:
-                        logger.info(f"Received audio data: {len(response.data)} bytes")
-                        await self.message_queue.put(APIMessage(
-                            message_type='audio',
-                            audio_data=response.data,
-                            metadata={'sample_rate': 24000}
-                        ))
+                    data = getattr(response, 'data', None)
+                    if data:
+                        self._audio_bytes_received += len(data)
+                        self._audio_chunks_received += 1
+                        if self._audio_chunks_received % AUDIO_STATS_INTERVAL == 0:
+                            logger.info("Received %d audio chunks (%d bytes) from Gemini",
+                                        self._audio_chunks_received, self._audio_bytes_received)
+                        now = time.monotonic_ns()
+                        if not audio_accum:
+                            audio_started_ns = now
+                            flush_timer = loop.call_later(AUDIO_COALESCE_MAX_NS / 1e9, flush_audio)
+                        audio_accum += data
+                        if (len(audio_accum) >= AUDIO_COALESCE_BYTES
+                                or now - audio_started_ns >= AUDIO_COALESCE_MAX_NS):
+                            flush_audio()
+                        # Audio chunks carry nothing else, unless the turn ends with this one
+                        if not getattr(server_content, 'turn_complete', None):
+                            continue
+                    
+                    # Anything else is a boundary - queue the merged audio ahead of it
+                    flush_audio()
                     
                     # Handle text responses
-                    if hasattr(response, 'text') and response.text:
-                        logger.info(f"Received text: {response.text}")
-                        await self.message_queue.put(APIMessage(
+                    text = getattr(response, 'text', None)
+                    if text:
+                        logger.info(f"Received text: {text}")
+                        await put(APIMessage(
                             message_type='text',
-                            content=response.text,
+                            content=text,
                             metadata={'is_assistant': True}
                         ))
-                        print(response.text, end="")  # Also print to console like reference
+                        print(text, end="")  # Also print to console like reference
                     
                     # Handle server content for function calls and other events
-                    if hasattr(response, 'server_content') and response.server_content:
-                        server_content = response.server_content
-                        
+                    if server_content:
                         # Check for model turn with function calls
-                        if hasattr(server_content, 'model_turn') and server_content.model_turn:
-                            logger.info(f"🔧 Model turn detected with {len(server_content.model_turn.parts)} parts")
-                            for part in server_content.model_turn.parts:
+                        model_turn = getattr(server_content, 'model_turn', None)
+                        if model_turn:
+                            logger.info(f"🔧 Model turn detected with {len(model_turn.parts)} parts")
+                            for part in model_turn.parts:
                                 # Handle function calls
-                                if hasattr(part, 'function_call') and part.function_call:
-                                    fc = part.function_call
+                                fc = getattr(part, 'function_call', None)
+                                if fc:
+                                    fc_id = getattr(fc, 'id', fc.name)
                                     logger.info(f"🔧 FUNCTION CALL DETECTED IN GEMINI:")
                                     logger.info(f"🔧   Name: {fc.name}")
                                     logger.info(f"🔧   Args: {fc.args}")
-                                    logger.info(f"🔧   ID: {getattr(fc, 'id', 'no_id')}")
+                                    logger.info(f"🔧   ID: {fc_id}")
                                     
                                     tool_call = {
                                         'name': fc.name,
                                         'arguments': fc.args,
-                                        'call_id': fc.id if hasattr(fc, 'id') else fc.name
+                                        'call_id': fc_id
                                     }
                                     logger.info(f"🔧 SENDING TOOL CALL TO HANDLER: {tool_call}")
                                     
-                                    await self.message_queue.put(APIMessage(
+                                    await put(APIMessage(
                                         message_type='tool_call',
                                         tool_calls=[tool_call]
                                     ))
                         
                         # Check for turn_complete event
-                        if hasattr(server_content, 'turn_complete') and server_content.turn_complete:
-                            logger.debug("Turn complete")
+                        if getattr(server_content, 'turn_complete', None):
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug("Turn complete")
+                            await put(APIMessage(message_type='turn_complete'))
                     
                     # Handle setup_complete event
-                    if hasattr(response, 'setup_complete') and response.setup_complete:
+                    if getattr(response, 'setup_complete', None):
                         logger.info("Gemini session setup complete")
                 
+                # The turn's stream ended - don't hold back its last audio
+                flush_audio()
+                
         except asyncio.CancelledError:
             logger.info("Receive loop cancelled")
             raise
@@ -328,7 +522,7 @@ class GeminiLiveManager(RealtimeAPIManager):
             if "keepalive ping timeout" in str(e) or "ConnectionClosedError" in str(e):
                 logger.warning(f"WebSocket connection lost in receive loop: {e}")
                 # Signal that connection is lost
-                await self.message_queue.put(APIMessage(
+                await put(APIMessage(
                     message_type='error',
                     content="Connection lost - WebSocket timeout"
                 ))
@@ -338,8 +532,12 @@ class GeminiLiveManager(RealtimeAPIManager):
                 logger.error(traceback.format_exc())
                 # Raise KeyboardInterrupt to stop the agent for debugging
                 raise KeyboardInterrupt(f"API Error in _receive_loop: {e}")
+        finally:
+            if flush_timer is not None:
+                flush_timer.cancel()
 
-    def _convert_tools_to_gemini_format(self, tools: List[Dict[str, Any]]) -> List[types.Tool]:
+    @staticmethod
+    def _convert_tools_to_gemini_format(tools: List[Dict[str, Any]]) -> List[types.Tool]:
         """Convert OpenAI-style tools to Gemini format."""
         gemini_tools = []
         
@@ -360,35 +558,12 @@ class GeminiLiveManager(RealtimeAPIManager):
         
         return gemini_tools
 
-    async def _take_screenshot(self) -> bytes:
-        """Take a screenshot and return as PNG bytes."""
+    async def _take_screenshot(self) -> Optional[types.Blob]:
+        """Take a screenshot and return it as a JPEG Blob."""
         try:
-            with mss.mss() as sct:
-                # Capture the primary monitor
-                monitor = sct.monitors[1]  # 0 is all monitors, 1 is primary
-                screenshot = sct.grab(monitor)
-                
-                # Convert to PIL Image
-                img = Image.frombytes(
-                    'RGB',
-                    (screenshot.width, screenshot.height),
-                    screenshot.rgb
-                )
-                
-                # Resize if too large (Gemini has size limits)
-                max_size = (1920, 1080)
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # Convert to PNG bytes
-                img_buffer = io.BytesIO()
-                img.save(img_buffer, format='PNG', optimize=True)
-                img_buffer.seek(0)
-                
-                logger.info(f"Screenshot captured: {img.size}")
-                screenshot_bytes = img_buffer.getvalue()
-                logger.debug(f"Screenshot bytes length: {len(screenshot_bytes)}, type: {type(screenshot_bytes)}")
-                return screenshot_bytes
-                
+            # Capture off the event loop so audio keeps flowing meanwhile
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_screenshot_executor, _capture_screenshot)
         except Exception as e:
             logger.error(f"Error taking screenshot: {e}")
-            return None 
\ No newline at end of file
+            return None
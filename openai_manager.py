@@ -3,18 +3,47 @@ OpenAI Realtime API implementation.
 """
 
 import asyncio
-import json
 import logging
 import base64
 from typing import Dict, Any, Optional, AsyncIterator, List
 
 import aiohttp
-import websockets
+import orjson
+
+try:
+    # SIMD-accelerated base64; encodes straight to str without a bytes.decode() copy
+    import pybase64
+    _b64encode_str = pybase64.b64encode_as_string
+except ImportError:
+    def _b64encode_str(data) -> str:
+        return base64.b64encode(data).decode('ascii')
 
 from api_manager_base import RealtimeAPIManager, APIMessage
 
 logger = logging.getLogger(__name__)
 
+# Microphone chunks waiting to be encoded and sent; the oldest is dropped when full
+AUDIO_SEND_QUEUE_MAXSIZE = 50
+
+# input_audio_buffer.append frames have a fixed shape, so build them without json.dumps
+_AUDIO_APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+_AUDIO_APPEND_SUFFIX = '"}'
+
+def _dumps(obj) -> str:
+    """Serialize a client event for a websocket text frame."""
+    return orjson.dumps(obj).decode()
+
+
+# Other fixed-shape client events
+_RESPONSE_CREATE = '{"type":"response.create"}'
+_SESSION_UPDATE_PREFIX = '{"type":"session.update","session":{"instructions":'
+_FUNCTION_OUTPUT_PREFIX = '{"type":"conversation.item.create","item":{"type":"function_call_output","call_id":'
+_FUNCTION_OUTPUT_MIDDLE = ',"output":'
+_FUNCTION_OUTPUT_SUFFIX = '}}'
+
+# Frame types that carry server events
+_DATA_FRAMES = (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY)
+
 
 class OpenAIRealtimeManager(RealtimeAPIManager):
     """Manages OpenAI Realtime API session creation and WebSocket connection."""
@@ -22,104 +51,200 @@ class OpenAIRealtimeManager(RealtimeAPIManager):
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.websocket = None
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._http_loop = None
         self.session_token = None
+        self._audio_queue = None
+        self._audio_sender = None
+        self._sender_error: Optional[APIMessage] = None  # Reported by receive_messages once the socket closes
+
+        # session.update after the instructions, cached for the last tool set seen
+        self._session_update_suffix: Optional[str] = None
+        self._session_tools_key: Optional[bytes] = None
+
+        # Server event type -> converter to APIMessage; events not listed are ignored
+        self._event_converters = {
+            'response.audio.delta': self._on_audio_delta,
+            'response.audio_transcript.done': self._on_assistant_transcript,
+            'conversation.item.input_audio_transcription.completed': self._on_user_transcript,
+            'response.function_call_arguments.done': self._on_function_call,
+            'response.done': self._on_response_done,
+            'error': self._on_error,
+            'session.created': self._on_session_created,
+        }
+
+    def _get_http(self) -> aiohttp.ClientSession:
+        """Return the pooled HTTP session shared by session creation and the WebSocket.
+
+        A ClientSession is tied to the event loop it was created on, and each
+        check-in runs on its own loop, so a session left over from another loop
+        is replaced rather than reused.
+        """
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.closed or self._http_loop is not loop:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=4, ttl_dns_cache=300, keepalive_timeout=75)
+            )
+            self._http_loop = loop
+        return self._http
+
+    async def _close_http(self):
+        """Close the pooled HTTP session, if one is open on the running loop."""
+        if self._http is not None:
+            if self._http_loop is asyncio.get_running_loop():
+                await self._http.close()
+            self._http = None
+            self._http_loop = None
 
     async def create_session(self) -> str:
         """Create a new OpenAI Realtime session and return the session token."""
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
+        # The kept-alive connection is reused for the WebSocket upgrade in connect()
+        session = self._get_http()
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
 
-            payload = {
-                'model': 'gpt-4o-realtime-preview-2025-06-03',
-                'voice': 'sage'
-            }
+        payload = {
+            'model': 'gpt-4o-realtime-preview-2025-06-03',
+            'voice': 'sage'
+        }
 
-            async with session.post(
-                'https://api.openai.com/v1/realtime/sessions',
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to create session: {response.status}")
+        async with session.post(
+            'https://api.openai.com/v1/realtime/sessions',
+            headers=headers,
+            json=payload
+        ) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to create session: {response.status}")
 
-                data = await response.json()
-                logger.info("Created new OpenAI Realtime session")
-                self.session_token = data['client_secret']['value']
-                return self.session_token
+            data = await response.json()
+            logger.info("Created new OpenAI Realtime session")
+            self.session_token = data['client_secret']['value']
+            return self.session_token
 
-    async def connect(self, session_token: str) -> websockets.WebSocketClientProtocol:
+    async def connect(self, session_token: str) -> aiohttp.ClientWebSocketResponse:
         """Connect to OpenAI Realtime WebSocket."""
         uri = f"wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2025-06-03"
 
         try:
             # Create headers for authentication
-            headers = [
-                ('Authorization', f'Bearer {session_token}'),
-                ('OpenAI-Beta', 'realtime=v1')
-            ]
+            headers = {
+                'Authorization': f'Bearer {session_token}',
+                'OpenAI-Beta': 'realtime=v1'
+            }
 
-            # Use additional_headers for websockets 11.0+
-            self.websocket = await websockets.connect(uri, additional_headers=headers)
+            # aiohttp's client parses frames and validates UTF-8 in C and answers
+            # pings itself, which keeps up with the Realtime API's event rate
+            self.websocket = await self._get_http().ws_connect(
+                uri, headers=headers, autoping=True, compress=0
+            )
             self.is_connected = True
+            self._sender_error = None
+
+            # Encoding and sending audio happens in its own task so send_audio never blocks
+            self._audio_queue = asyncio.Queue(maxsize=AUDIO_SEND_QUEUE_MAXSIZE)
+            self._audio_sender = asyncio.create_task(self._audio_send_loop())
             logger.info("Connected to OpenAI Realtime WebSocket")
             return self.websocket
 
         except Exception as e:
             logger.error(f"Failed to connect to WebSocket: {e}")
+            await self._close_http()
             raise
 
     async def disconnect(self):
         """Disconnect from the WebSocket."""
+        self._reset_audio_batch()
+        if self._audio_sender and not self._audio_sender.done():
+            self._audio_sender.cancel()
+            try:
+                await self._audio_sender
+            except asyncio.CancelledError:
+                pass
+        self._audio_sender = None
+        self._audio_queue = None
+
         if self.websocket:
             await self.websocket.close()
             self.websocket = None
             self.is_connected = False
             logger.info("Disconnected from OpenAI WebSocket")
+        await self._close_http()
 
     async def configure_session(self, system_prompt: str, tools: List[Dict[str, Any]], **kwargs):
         """Configure the OpenAI session with system prompt and tools."""
-        session_update = {
-            "type": "session.update",
-            "session": {
-                "modalities": ["text", "audio"],
-                "instructions": system_prompt,
-                "voice": "sage",
-                "input_audio_format": "pcm16",
-                "output_audio_format": "pcm16",
-                "input_audio_transcription": {
-                    "model": "whisper-1"
-                },
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": 0.5,
-                    "prefix_padding_ms": 300,
-                    "silence_duration_ms": 500
-                },
-                "tools": tools,
-                "tool_choice": "auto",
-                "temperature": 0.8
-            }
-        }
+        # Only the instructions change between check-ins, so the rest of the
+        # session.update event is rendered once per distinct tool set
+        tools_key = orjson.dumps(tools)
+        if tools_key != self._session_tools_key:
+            self._session_update_suffix = self._render_session_suffix(tools)
+            self._session_tools_key = tools_key
         
-        await self.websocket.send(json.dumps(session_update))
+        await self.websocket.send_str(
+            _SESSION_UPDATE_PREFIX + _dumps(system_prompt) + self._session_update_suffix
+        )
         logger.info("Configured OpenAI Realtime session")
 
-    async def send_audio(self, audio_data: bytes, source_sample_rate: int = 24000):
-        """Send audio data to OpenAI."""
-        if not self.websocket:
+    @staticmethod
+    def _render_session_suffix(tools: List[Dict[str, Any]]) -> str:
+        """Render the session.update fields after "instructions", through the closing braces."""
+        session = _dumps({
+            "modalities": ["text", "audio"],
+            "voice": "sage",
+            "input_audio_format": "pcm16",
+            "output_audio_format": "pcm16",
+            "input_audio_transcription": {
+                "model": "whisper-1"
+            },
+            "turn_detection": {
+                "type": "server_vad",
+                "threshold": 0.5,
+                "prefix_padding_ms": 300,
+                "silence_duration_ms": 500
+            },
+            "tools": tools,
+            "tool_choice": "auto",
+            "temperature": 0.8
+        })
+        return "," + session[1:] + "}"
+
+    async def _send_audio_chunk(self, audio_data: bytes, source_sample_rate: int):
+        """Queue audio data to be sent to OpenAI by the background sender."""
+        queue = self._audio_queue
+        if not self.websocket or queue is None:
             return
             
         # OpenAI expects 24kHz PCM16, so we may need to resample if input is different
         # For now, we'll assume the audio is already in the correct format
-        audio_event = {
-            "type": "input_audio_buffer.append",
-            "audio": base64.b64encode(audio_data).decode('utf-8')
-        }
-        
-        await self.websocket.send(json.dumps(audio_event))
+        if queue.full():
+            queue.get_nowait()  # Drop the stalest chunk rather than fall further behind
+            logger.debug("Audio send queue full - dropped oldest chunk")
+        queue.put_nowait(bytes(audio_data))
+
+    async def _audio_send_loop(self):
+        """Base64-encode queued audio chunks and send them as input_audio_buffer.append frames."""
+        queue = self._audio_queue
+        websocket = self.websocket  # The socket is fixed for this sender's lifetime
+        send_str = websocket.send_str
+        prefix, suffix, encode = _AUDIO_APPEND_PREFIX, _AUDIO_APPEND_SUFFIX, _b64encode_str
+        try:
+            while True:
+                audio_data = await queue.get()
+                await send_str(prefix + encode(audio_data) + suffix)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Without the sender the mic goes nowhere - end the session rather than run deaf
+            logger.error(f"Audio sender stopped: {e}")
+            self.is_connected = False
+            self._sender_error = APIMessage(
+                message_type='error',
+                content=f"Connection lost - audio sender failed: {e}",
+                metadata={'event_type': 'audio_sender'}
+            )
+            # Closing the socket ends receive_messages, which then reports the error
+            await websocket.close()
 
     async def send_text(self, text: str, image_data: Optional[bytes] = None):
         """Send text to OpenAI. Note: OpenAI Realtime API doesn't support images."""
@@ -135,92 +260,101 @@ class OpenAIRealtimeManager(RealtimeAPIManager):
             }
         }
         
-        await self.websocket.send(json.dumps(message))
+        await self.websocket.send_str(_dumps(message))
         
         # Trigger response
-        response_create = {
-            "type": "response.create"
-        }
-        await self.websocket.send(json.dumps(response_create))
+        await self.websocket.send_str(_RESPONSE_CREATE)
 
     async def receive_messages(self) -> AsyncIterator[APIMessage]:
         """Receive and convert OpenAI messages to standardized format."""
+        loads = orjson.loads
+        convert = self._convert_openai_message
         async for message in self.websocket:
-            data = json.loads(message)
-            api_message = self._convert_openai_message(data)
+            # Pings are answered by aiohttp (autoping) and close frames end the loop
+            if message.type not in _DATA_FRAMES:
+                if message.type is aiohttp.WSMsgType.ERROR:
+                    logger.error(f"WebSocket error: {self.websocket.exception()}")
+                    break
+                continue
+            api_message = convert(loads(message.data))
             if api_message:
                 yield api_message
 
+        if self._sender_error is not None:
+            error, self._sender_error = self._sender_error, None
+            yield error
+
     async def send_tool_response(self, tool_responses: List[Dict[str, Any]]):
         """Send tool responses to OpenAI."""
         for response in tool_responses:
-            result_event = {
-                "type": "conversation.item.create",
-                "item": {
-                    "type": "function_call_output",
-                    "call_id": response['call_id'],
-                    "output": json.dumps(response['result'])
-                }
-            }
-            await self.websocket.send(json.dumps(result_event))
+            # Only the call id and the (JSON-encoded) output vary; both are JSON-escaped strings
+            await self.websocket.send_str(
+                _FUNCTION_OUTPUT_PREFIX + _dumps(response['call_id'])
+                + _FUNCTION_OUTPUT_MIDDLE + _dumps(_dumps(response['result']))
+                + _FUNCTION_OUTPUT_SUFFIX
+            )
 
     def _convert_openai_message(self, event: Dict[str, Any]) -> Optional[APIMessage]:
         """Convert OpenAI event to standardized APIMessage."""
-        event_type = event.get('type')
-        
-        if event_type == 'response.audio.delta':
-            audio_data = event.get('delta', '')
-            if audio_data:
-                return APIMessage(
-                    message_type='audio',
-                    audio_data=base64.b64decode(audio_data),
-                    metadata={'event_type': event_type}
-                )
-                
-        elif event_type == 'response.audio_transcript.done':
-            transcript = event.get('transcript', '')
-            if transcript:
-                return APIMessage(
-                    message_type='text',
-                    content=transcript,
-                    metadata={'event_type': event_type, 'is_assistant': True}
-                )
-                
-        elif event_type == 'conversation.item.input_audio_transcription.completed':
-            transcript = event.get('transcript', '')
-            if transcript:
-                return APIMessage(
-                    message_type='text',
-                    content=transcript,
-                    metadata={'event_type': event_type, 'is_user': True}
-                )
-                
-        elif event_type == 'response.function_call_arguments.done':
-            function_name = event.get('name')
-            arguments = event.get('arguments', '{}')
-            call_id = event.get('call_id')
-            
+        converter = self._event_converters.get(event.get('type'))
+        return converter(event) if converter else None
+
+    def _on_audio_delta(self, event: Dict[str, Any]) -> Optional[APIMessage]:
+        audio_data = event.get('delta', '')
+        if audio_data:
             return APIMessage(
-                message_type='tool_call',
-                tool_calls=[{
-                    'name': function_name,
-                    'arguments': json.loads(arguments),
-                    'call_id': call_id
-                }],
-                metadata={'event_type': event_type}
+                message_type='audio',
+                audio_b64=audio_data,  # Decoded only when the consumer reads audio_data
+                metadata={'event_type': event['type']}
             )
-            
-        elif event_type == 'error':
+        return None
+
+    def _on_assistant_transcript(self, event: Dict[str, Any]) -> Optional[APIMessage]:
+        transcript = event.get('transcript', '')
+        if transcript:
             return APIMessage(
-                message_type='error',
-                content=str(event),
-                metadata={'event_type': event_type}
+                message_type='text',
+                content=transcript,
+                metadata={'event_type': event['type'], 'is_assistant': True}
             )
-            
-        elif event_type == 'session.created':
+        return None
+
+    def _on_user_transcript(self, event: Dict[str, Any]) -> Optional[APIMessage]:
+        transcript = event.get('transcript', '')
+        if transcript:
             return APIMessage(
-                message_type='session_update',
-                metadata={'event_type': event_type, 'session_id': event.get('session', {}).get('id')}
+                message_type='text',
+                content=transcript,
+                metadata={'event_type': event['type'], 'is_user': True}
             )
-            
-        return None 
\ No newline at end of file
+        return None
+
+    def _on_function_call(self, event: Dict[str, Any]) -> APIMessage:
+        return APIMessage(
+            message_type='tool_call',
+            tool_calls=[{
+                'name': event.get('name'),
+                'arguments': orjson.loads(event.get('arguments', '{}')),
+                'call_id': event.get('call_id')
+            }],
+            metadata={'event_type': event['type']}
+        )
+
+    def _on_response_done(self, event: Dict[str, Any]) -> APIMessage:
+        return APIMessage(
+            message_type='turn_complete',
+            metadata={'event_type': event['type']}
+        )
+
+    def _on_error(self, event: Dict[str, Any]) -> APIMessage:
+        return APIMessage(
+            message_type='error',
+            content=str(event),
+            metadata={'event_type': event['type']}
+        )
+
+    def _on_session_created(self, event: Dict[str, Any]) -> APIMessage:
+        return APIMessage(
+            message_type='session_update',
+            metadata={'event_type': event['type'], 'session_id': event.get('session', {}).get('id')}
+        )
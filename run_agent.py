@@ -12,6 +12,15 @@ from voice_check_agent import VoiceCheckAgent
 # Load environment variables from .env file
 load_dotenv()
 
+# Use uvloop's libuv-based event loop when available. Setting the policy (rather
+# than only the loop asyncio.run creates) also covers the per-check-in loops the
+# agent creates on its timer thread.
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
 def check_requirements():
     """Check if all requirements are met before starting."""
     errors = []
@@ -23,7 +32,6 @@ def check_requirements():
     # Check for required modules
     try:
         import pyaudio
-        import websockets
         import aiohttp
         import dotenv
     except ImportError as e:
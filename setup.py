@@ -6,6 +6,12 @@ This script helps with initial setup and dependency installation.
 
 import os
 import sys
+import json
+import time
+import shutil
+import ctypes.util
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import subprocess
 import platform
 
@@ -26,21 +32,47 @@ def check_python_version():
     print(f"✅ Python version: {version.major}.{version.minor}.{version.micro}")
     return True
 
+def _portaudio_installed(system):
+    """Check whether PortAudio is already installed, without invoking a package manager."""
+    try:
+        if subprocess.run(["pkg-config", "--exists", "portaudio-2.0"]).returncode == 0:
+            return True
+    except FileNotFoundError:
+        pass
+    # On Linux PyAudio is built from source and needs the headers, which only pkg-config confirms
+    return system != "Linux" and ctypes.util.find_library("portaudio") is not None
+
+def _apt_lists_fresh(max_age_s=3600):
+    """Whether apt's package lists were refreshed within max_age_s seconds."""
+    try:
+        return time.time() - os.path.getmtime("/var/lib/apt/lists") < max_age_s
+    except OSError:
+        return False
+
 def install_system_dependencies():
     """Install system dependencies for audio processing."""
     system = platform.system()
     
     print("\n📦 Installing system dependencies...")
     
+    if system in ("Darwin", "Linux") and _portaudio_installed(system):
+        print("✅ PortAudio already installed")
+        return True
+    
     if system == "Darwin":  # macOS
         print("Detected macOS")
+        # Look brew up on PATH rather than running `brew --version` - every brew
+        # invocation pays for starting Ruby and loading Homebrew
+        if not shutil.which("brew"):
+            print("⚠️  Homebrew not found. Please install PortAudio manually:")
+            print("   brew install portaudio")
+            return False
         try:
-            subprocess.run(["brew", "--version"], check=True, capture_output=True)
             print("Installing PortAudio via Homebrew...")
             subprocess.run(["brew", "install", "portaudio"], check=True)
             print("✅ PortAudio installed successfully")
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            print("⚠️  Homebrew not found. Please install PortAudio manually:")
+        except subprocess.CalledProcessError:
+            print("⚠️  Failed to install PortAudio. Please install manually:")
             print("   brew install portaudio")
             return False
     
@@ -50,7 +82,8 @@ def install_system_dependencies():
         if os.path.exists("/usr/bin/apt-get"):
             print("Installing PortAudio via apt...")
             try:
-                subprocess.run(["sudo", "apt-get", "update"], check=True)
+                if not _apt_lists_fresh():
+                    subprocess.run(["sudo", "apt-get", "update"], check=True)
                 subprocess.run(["sudo", "apt-get", "install", "-y", "portaudio19-dev"], check=True)
                 print("✅ PortAudio installed successfully")
             except subprocess.CalledProcessError:
@@ -75,29 +108,101 @@ def install_system_dependencies():
     
     return True
 
-def install_python_dependencies():
-    """Install Python dependencies."""
+def _unsatisfied_requirements(path="requirements.txt"):
+    """Return the requirement lines in path that aren't installed at a matching version.
+
+    Returns None when this can't be determined (packaging unavailable), in which
+    case everything should be installed.
+    """
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+        from packaging.requirements import Requirement, InvalidRequirement
+    except ImportError:
+        return None
+    
+    missing = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                req = Requirement(line)
+            except InvalidRequirement:
+                return None
+            if req.marker is not None and not req.marker.evaluate():
+                continue
+            try:
+                installed = version(req.name)
+            except PackageNotFoundError:
+                missing.append(line)
+                continue
+            if not req.specifier.contains(installed, prereleases=True):
+                missing.append(line)
+    return missing
+
+_UNCHECKED = object()
+
+def install_python_dependencies(missing=_UNCHECKED):
+    """Install Python dependencies.
+
+    Args:
+        missing: Result of _unsatisfied_requirements() if the caller already has it
+    """
     print("\n🐍 Installing Python dependencies...")
     
+    # Checking installed versions is instant; starting pip just to find nothing to do isn't
+    if missing is _UNCHECKED:
+        missing = _unsatisfied_requirements()
+    if missing == []:
+        print("✅ Python dependencies already installed")
+        return True
+    targets = ["-r", "requirements.txt"] if missing is None else missing
+    
+    # uv resolves and downloads in parallel - much faster than pip when it's installed
+    if shutil.which("uv"):
+        try:
+            subprocess.run([
+                "uv", "pip", "install", "--python", sys.executable, *targets
+            ], check=True)
+            print("✅ Python dependencies installed successfully (uv)")
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"⚠️  uv install failed ({e}), falling back to pip")
+    
     try:
-        subprocess.run([sys.executable, "-m", "pip", "install", "--upgrade", "pip"], check=True)
-        subprocess.run([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"], check=True)
+        subprocess.run([
+            sys.executable, "-m", "pip", "install", "--upgrade",
+            "--disable-pip-version-check", "pip"
+        ], check=True)
+        # Without --upgrade, requirements that are already satisfied are left alone
+        subprocess.run([
+            sys.executable, "-m", "pip", "install",
+            "--disable-pip-version-check", "--prefer-binary", *targets
+        ], check=True)
         print("✅ Python dependencies installed successfully")
         return True
     except subprocess.CalledProcessError as e:
         print(f"❌ Failed to install Python dependencies: {e}")
         return False
 
+@lru_cache(maxsize=1)
+def _load_env_file():
+    """Load the .env file once per process, if python-dotenv is available."""
+    # Imported here rather than at module level: python-dotenv is installed by
+    # install_python_dependencies earlier in this same run
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return False
+    return load_dotenv()
+
 def setup_environment():
     """Help user set up environment variables."""
     print("\n🔑 Setting up environment...")
     
     # Load .env file if it exists
-    try:
-        from dotenv import load_dotenv
-        load_dotenv()
-    except ImportError:
-        pass
+    _load_env_file()
     
     api_key = os.getenv('OPENAI_API_KEY')
     if api_key:
@@ -128,36 +233,80 @@ def setup_environment():
     
     return False
 
+# Only this many devices of each kind are listed, so enumeration stops once both are found
+DEVICES_SHOWN = 3
+
+DEVICE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "voice_check_agent", "devices.json")
+
+def _load_cached_devices(path, fingerprint):
+    """Return cached (input_devices, output_devices) if the device fingerprint still matches."""
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("fingerprint") != list(fingerprint):
+        return None
+    return cached["input_devices"], cached["output_devices"], cached.get("complete", True)
+
+def _save_cached_devices(path, fingerprint, input_devices, output_devices, complete):
+    """Store the device lists with the fingerprint they were enumerated under."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "fingerprint": list(fingerprint),
+                "input_devices": input_devices,
+                "output_devices": output_devices,
+                "complete": complete,
+            }, f)
+    except OSError:
+        pass  # The cache is only an optimization
+
 def test_audio_devices():
     """Test audio device availability."""
     print("\n🔊 Testing audio devices...")
     
     try:
-        import pyaudio
-        
-        audio = pyaudio.PyAudio()
-        
-        # Check input devices
-        input_devices = []
-        output_devices = []
+        from audio_feedback_manager import get_pyaudio, get_default_device_indices, release_pyaudio
         
-        for i in range(audio.get_device_count()):
-            info = audio.get_device_info_by_index(i)
-            if info['maxInputChannels'] > 0:
-                input_devices.append(f"  {i}: {info['name']}")
-            if info['maxOutputChannels'] > 0:
-                output_devices.append(f"  {i}: {info['name']}")
+        try:
+            audio = get_pyaudio()
+            
+            # Enumerating devices is slow on some host APIs, so reuse the last
+            # enumeration while the device count and defaults are unchanged
+            fingerprint = (audio.get_device_count(), *get_default_device_indices())
+            cached = _load_cached_devices(DEVICE_CACHE_PATH, fingerprint)
+            if cached:
+                input_devices, output_devices, complete = cached
+            else:
+                input_devices = []
+                output_devices = []
+                complete = True
+                
+                for i in range(fingerprint[0]):
+                    if len(input_devices) >= DEVICES_SHOWN and len(output_devices) >= DEVICES_SHOWN:
+                        complete = False  # Enough to show; skip querying the rest
+                        break
+                    info = audio.get_device_info_by_index(i)
+                    if info['maxInputChannels'] > 0:
+                        input_devices.append(f"  {i}: {info['name']}")
+                    if info['maxOutputChannels'] > 0:
+                        output_devices.append(f"  {i}: {info['name']}")
+                
+                _save_cached_devices(DEVICE_CACHE_PATH, fingerprint, input_devices, output_devices, complete)
+        finally:
+            release_pyaudio()
         
-        print(f"✅ Found {len(input_devices)} input device(s):")
-        for device in input_devices[:3]:  # Show first 3
+        more = "" if complete else "+"
+        print(f"✅ Found {len(input_devices)}{more} input device(s):")
+        for device in input_devices[:DEVICES_SHOWN]:  # Show first 3
             print(device)
         
-        print(f"✅ Found {len(output_devices)} output device(s):")
-        for device in output_devices[:3]:  # Show first 3
+        print(f"✅ Found {len(output_devices)}{more} output device(s):")
+        for device in output_devices[:DEVICES_SHOWN]:  # Show first 3
             print(device)
         
-        audio.terminate()
-        
         if not input_devices:
             print("⚠️  No microphone devices found")
             return False
@@ -181,25 +330,37 @@ def run_setup():
     
     success = True
     
-    # Check Python version
-    if not check_python_version():
-        success = False
-    
-    # Install system dependencies
-    if success and not install_system_dependencies():
-        success = False
-    
-    # Install Python dependencies
-    if success and not install_python_dependencies():
-        success = False
-    
-    # Test audio devices
-    if success and not test_audio_devices():
-        print("⚠️  Audio device issues detected - the agent may not work properly")
-    
-    # Setup environment
-    if success and not setup_environment():
-        success = False
+    # Steps that print stay on this thread in order; only silent, independent work
+    # (scanning installed packages, loading .env) overlaps with them
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        # Installed package versions don't depend on PortAudio, so check them meanwhile
+        missing_future = pool.submit(_unsatisfied_requirements)
+        
+        # Check Python version
+        if not check_python_version():
+            success = False
+        
+        # Install system dependencies
+        if success and not install_system_dependencies():
+            success = False
+        
+        # Install Python dependencies
+        if success and not install_python_dependencies(missing_future.result()):
+            success = False
+        
+        # python-dotenv is installed now; load .env while the audio devices are probed
+        env_future = pool.submit(_load_env_file) if success else None
+        
+        # Test audio devices
+        if success and not test_audio_devices():
+            print("⚠️  Audio device issues detected - the agent may not work properly")
+        
+        if env_future is not None:
+            env_future.result()
+        
+        # Setup environment
+        if success and not setup_environment():
+            success = False
     
     print("\n" + "=" * 60)
     if success:
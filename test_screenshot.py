@@ -1,17 +1,23 @@
 import mss
 import os
 from datetime import datetime
+from PIL import Image
 
 screenshots_dir = os.path.join(os.getcwd(), 'screenshots')
 os.makedirs(screenshots_dir, exist_ok=True)
 
 with mss.mss() as sct:
-    # Capture the entire virtual screen
-    sct_img = sct.grab(sct.monitors[0])
+    # Capture the primary monitor only (monitors[0] is the union of all monitors),
+    # matching what the agent sends
+    sct_img = sct.grab(sct.monitors[1])
     
-    # Save to file
-    filename = os.path.join(screenshots_dir, f'test_screenshot_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
-    mss.tools.to_png(sct_img.rgb, sct_img.size, output=filename)
+    # Decode the raw BGRA buffer in C instead of going through mss's .rgb copy,
+    # and downscale - a vision model doesn't need a full-resolution capture
+    img = Image.frombuffer('RGB', sct_img.size, sct_img.bgra, 'raw', 'BGRX', 0, 1)
+    img.thumbnail((1280, 1280), Image.Resampling.BILINEAR)
+    
+    # Save to file - JPEG encodes far faster and smaller than PNG for screen content
+    filename = os.path.join(screenshots_dir, f'test_screenshot_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jpg')
+    img.save(filename, 'JPEG', quality=70, optimize=True)
     print(f'Screenshot saved to: {filename}')
-    print(f'Screenshot size: {sct_img.size}')
-
+    print(f'Screenshot size: {sct_img.size} (saved at {img.size})')
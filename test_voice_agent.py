@@ -8,7 +8,7 @@ import asyncio
 import sys
 from voice_check_agent import VoiceCheckAgent
 
-async def test_agent():
+async def test_agent(snapshot: bool = False):
     """Test the voice check agent with a short interval."""
     print("🚀 Testing Voice Check Agent with Smart Disconnect")
     print("=" * 50)
@@ -22,6 +22,9 @@ async def test_agent():
     # Create agent with 1-minute interval for testing
     agent = VoiceCheckAgent(check_interval_minutes=1)
     
+    # Journal each message as it happens, so a killed test still leaves its history
+    agent.conversation_manager.journal_file = "test_conversation.ndjson"
+    
     try:
         print("\n📱 Starting agent...")
         await agent.start()
@@ -30,8 +33,9 @@ async def test_agent():
     except Exception as e:
         print(f"\n❌ Error during test: {e}")
     finally:
-        print("\n💾 Saving conversation history...")
-        agent.save_conversation_history("test_conversation.json")
+        if snapshot:
+            print("\n💾 Saving conversation history snapshot...")
+            agent.save_conversation_history("test_conversation.json")
         print("✅ Test completed!")
 
 if __name__ == "__main__":
@@ -40,7 +44,9 @@ if __name__ == "__main__":
         print("=" * 30)
         print("This script tests the voice agent with smart connect/disconnect functionality.")
         print("\nUsage:")
-        print("  python test_voice_agent.py")
+        print("  python test_voice_agent.py [--snapshot]")
+        print("\n  Messages are journaled to conversation_histories/test_conversation.ndjson as they occur;")
+        print("  --snapshot also writes the full history to test_conversation.json on exit.")
         print("\nWhat happens:")
         print("1. Agent starts and immediately performs a check-in")
         print("2. You can talk to the agent via voice")
@@ -57,4 +63,4 @@ if __name__ == "__main__":
     print("Run with --help for more information")
     print("Press Ctrl+C to stop\n")
     
-    asyncio.run(test_agent()) 
\ No newline at end of file
+    asyncio.run(test_agent(snapshot="--snapshot" in sys.argv[1:])) 
\ No newline at end of file
@@ -5,12 +5,14 @@ for voice-to-voice communication with periodic check-ins to help users stay prod
 """
 
 import asyncio
-import json
+import contextvars
+import functools
 import logging
 import os
 import threading
 import time
 from datetime import datetime
+from itertools import islice
 from typing import List, Dict, Any
 import pyaudio
 import wave
@@ -32,6 +34,19 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# How long a check-in waits for in-flight tool calls (e.g. a disconnect that is waiting
+# for the final turn and playback) before cancelling them; covers the disconnect timeout
+TOOL_TASK_DRAIN_TIMEOUT = 15.0
+
+
+async def _fast_to_thread(func, *args):
+    """Like asyncio.to_thread, but skips the context copy when there is no context to propagate."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    if not ctx:
+        return await loop.run_in_executor(None, func, *args)
+    return await loop.run_in_executor(None, functools.partial(ctx.run, func, *args))
+
 
 class VoiceCheckAgent:
     """Main Voice Check Agent class that orchestrates all components."""
@@ -69,6 +84,10 @@ class VoiceCheckAgent:
         # Session state
         self.session_id = None
         
+        # Set when the API completes a turn; lets a pending disconnect proceed early
+        self.confirmation_event = asyncio.Event()
+        self._tool_tasks = set()
+        
         logger.info(f"Initialized Voice Check Agent with {self.api_provider.upper()} API")
     
     def _get_tools_definition(self) -> List[Dict[str, Any]]:
@@ -138,8 +157,9 @@ class VoiceCheckAgent:
             async for message in self.api_manager.receive_messages():
                 await self.process_api_message(message)
                 
-                # Check if we should disconnect after processing
-                if self.should_disconnect:
+                # Check if we should disconnect after processing; keep receiving while
+                # a tool call (e.g. a pending disconnect) still needs API events
+                if self.should_disconnect and not self._tool_tasks:
                     logger.info("Agent requested disconnection - ending session")
                     break
                     
@@ -167,7 +187,15 @@ class VoiceCheckAgent:
             # Handle function calls
             if message.tool_calls:
                 logger.info(f"🔧 Received {len(message.tool_calls)} tool calls")
-                await self.tool_handler.handle_function_call(message.tool_calls, self)
+                # Run in the background so the receive loop can still deliver the
+                # turn completion a disconnect waits for
+                self.confirmation_event.clear()
+                task = asyncio.create_task(self.tool_handler.handle_function_call(message.tool_calls, self))
+                self._tool_tasks.add(task)
+                task.add_done_callback(self._tool_tasks.discard)
+                
+        elif message.message_type == 'turn_complete':
+            self.confirmation_event.set()
                 
         elif message.message_type == 'error':
             logger.error(f"API error: {message.content}")
@@ -208,14 +236,15 @@ class VoiceCheckAgent:
     
     async def audio_input_loop(self):
         """Continuously capture audio input and send to API."""
+        if not self.audio_manager.input_stream:
+            return
         while self.is_running and self.api_manager.is_connected and not self.should_disconnect:
             try:
-                if self.audio_manager.input_stream:
-                    audio_data = self.audio_manager.input_stream.read(
-                        self.audio_manager.chunk, exception_on_overflow=False
-                    )
-                    await self.send_audio_chunk(audio_data)
-                await asyncio.sleep(0.01)  # Small delay to prevent overwhelming the API
+                # Chunks arrive from the input stream callback - no blocking read on the loop
+                audio_data = await self.audio_manager.read_input()
+                if audio_data is None:
+                    break  # Input stream closed (e.g. disconnect requested by a tool)
+                await self.send_audio_chunk(audio_data)
                 
             except Exception as e:
                 logger.error(f"Error in audio input loop: {e}")
@@ -230,6 +259,7 @@ class VoiceCheckAgent:
             self.should_disconnect = False
             self.alarm_triggered = False
             self.disconnect_reason = None  # Reset disconnect reason for new cycle
+            self.confirmation_event = asyncio.Event()  # Each cycle runs in its own event loop
             
             # Connect to API
             session_token = await self.api_manager.create_session()
@@ -261,6 +291,13 @@ class VoiceCheckAgent:
             # Cancel any remaining tasks
             audio_task.cancel()
             message_task.cancel()
+            # Let tool calls finish - a disconnect cancelled mid-close would leak the
+            # connection - and only cancel the ones that overrun
+            if self._tool_tasks:
+                _, overdue = await asyncio.wait(list(self._tool_tasks), timeout=TOOL_TASK_DRAIN_TIMEOUT)
+                for task in overdue:
+                    logger.warning("Cancelling tool call still running after %.0fs", TOOL_TASK_DRAIN_TIMEOUT)
+                    task.cancel()
             
             # Always disconnect after check-in (if not already disconnected)
             if self.api_manager.is_connected:
@@ -288,8 +325,9 @@ class VoiceCheckAgent:
             else:
                 logger.info("🔌 Starting disconnect process...")
             
-            # Close audio streams
-            self.audio_manager.close_streams()
+            # Close audio streams; flushing the recording and stopping streams blocks,
+            # so keep it off the event loop
+            await _fast_to_thread(self.audio_manager.close_streams)
             
             # Disconnect from API
             await self.api_manager.disconnect()
@@ -365,7 +403,7 @@ class VoiceCheckAgent:
         """Save conversation history to a JSON file."""
         logger.info(f"💾 Saving conversation history with {len(self.conversation_manager.conversation_history)} messages")
         if self.conversation_manager.conversation_history:
-            logger.info(f"💾 Sample messages: {self.conversation_manager.conversation_history[:2]}")
+            logger.info(f"💾 Sample messages: {list(islice(self.conversation_manager.conversation_history, 2))}")
         else:
             logger.warning("💾 No conversation history to save!")
         self.conversation_manager.save_to_file(filename)